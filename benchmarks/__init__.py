@@ -0,0 +1,10 @@
+"""Нагрузочные замеры проекта. Запуск: python -m benchmarks.<имя>."""
+import os
+
+import django
+
+
+def setup(settings_module="yatube.settings"):
+    """Настраивает Django для запуска замера вне manage.py."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    django.setup()
@@ -0,0 +1,100 @@
+"""Сравнение бэкендов кэша: locmem, filebased и общий SQLiteCache.
+
+Замеряются get/set/get_many в одном процессе и incr из нескольких
+процессов. Для incr проверяется итоговое значение: у LocMemCache каждый
+процесс видит свою копию счётчика, поэтому он теряет обновления.
+
+    python -m benchmarks.cache --ops 5000 --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import tempfile
+import time
+
+from benchmarks import setup
+
+
+def make_backends(directory):
+    from django.core.cache.backends.filebased import FileBasedCache
+    from django.core.cache.backends.locmem import LocMemCache
+
+    from yatube.cache import SQLiteCache
+
+    params = {"OPTIONS": {"MAX_ENTRIES": 100000}}
+    return {
+        "locmem": lambda: LocMemCache("bench", params),
+        "filebased": lambda: FileBasedCache(f"{directory}/files", params),
+        "sqlite": lambda: SQLiteCache(f"{directory}/cache.sqlite3", params),
+    }
+
+
+def timed(func, ops):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    return round(ops / elapsed)
+
+
+def single_process(cache, ops):
+    value = "x" * 2048
+    keys = [f"key{number}" for number in range(ops)]
+    return {
+        "set_per_sec": timed(
+            lambda: [cache.set(key, value) for key in keys], ops
+        ),
+        "get_per_sec": timed(lambda: [cache.get(key) for key in keys], ops),
+        "get_many_10_per_sec": timed(
+            lambda: [
+                cache.get_many(keys[start:start + 10])
+                for start in range(0, ops, 10)
+            ],
+            ops,
+        ),
+    }
+
+
+def incr_worker(args):
+    directory, name, ops = args
+    setup()
+    cache = make_backends(directory)[name]()
+    # У locmem счётчика из родительского процесса здесь нет.
+    cache.add("counter", 0)
+    started = time.perf_counter()
+    for _ in range(ops):
+        cache.incr("counter")
+    return time.perf_counter() - started
+
+
+def multi_process(directory, name, ops, workers):
+    cache = make_backends(directory)[name]()
+    cache.set("counter", 0)
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        elapsed = max(
+            pool.map(incr_worker, [(directory, name, ops)] * workers)
+        )
+    return {
+        "incr_per_sec": round(ops * workers / elapsed),
+        "incr_expected": ops * workers,
+        "incr_seen": cache.get("counter"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ops", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    setup()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, factory in make_backends(directory).items():
+            results[name] = single_process(factory(), args.ops)
+            results[name].update(
+                multi_process(directory, name, args.ops // 10, args.workers)
+            )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
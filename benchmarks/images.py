@@ -0,0 +1,90 @@
+"""Размер вариантов изображения поста в байтах.
+
+Каждый вариант из POST_THUMBNAILS строится тем же движком sorl-thumbnail,
+что и на сайте, и сравнивается с прежней единственной миниатюрой
+960x339 в JPEG. Итог пересчитывается на страницу ленты из PAGE_SIZE
+карточек с изображениями.
+
+    python -m benchmarks.images --image media/posts/photo.jpg
+"""
+import argparse
+import json
+import random
+
+from benchmarks import setup
+
+
+def sample_image(width=1600, height=1200, seed=0):
+    """Синтетическое «фото»: градиент с шумом, плохо сжимаемый как снимок."""
+    from PIL import Image, ImageFilter
+
+    rnd = random.Random(seed)
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    noise = Image.frombytes(
+        "RGB", (width, height), rnd.randbytes(width * height * 3)
+    ).filter(ImageFilter.GaussianBlur(2))
+    return Image.blend(image, noise, 0.5)
+
+
+def encoded_size(engine, image, geometry, options):
+    from sorl.thumbnail.base import ThumbnailBackend
+    from sorl.thumbnail.conf import settings
+    from sorl.thumbnail.parsers import parse_geometry
+
+    options = dict(options)
+    for key, value in ThumbnailBackend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in ThumbnailBackend.extra_options:
+        options.setdefault(key, getattr(settings, attr))
+    ratio = engine.get_image_ratio(image, options)
+    thumbnail = engine.create(image, parse_geometry(geometry, ratio), options)
+    data = engine._get_raw_data(
+        thumbnail,
+        options["format"],
+        options["quality"],
+        image_info=engine.get_image_info(image),
+        progressive=options["progressive"],
+    )
+    return len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--image", help="исходное изображение")
+    args = parser.parse_args()
+    setup()
+    from PIL import Image
+    from sorl.thumbnail import default
+
+    from posts.paginators import PAGE_SIZE
+    from posts.thumbnails import POST_THUMBNAILS
+
+    image = Image.open(args.image) if args.image else sample_image()
+    engine = default.engine
+    baseline = encoded_size(
+        engine, image, "960x339",
+        {"crop": "center", "upscale": True, "format": "JPEG"},
+    )
+    variants = {
+        f"{geometry} {options['format']}": encoded_size(
+            engine, image, geometry, options
+        )
+        for geometry, options in POST_THUMBNAILS
+    }
+    results = {
+        "source": list(image.size),
+        "baseline_960x339_jpeg": baseline,
+        "variants": {
+            name: {"bytes": size, "of_baseline": round(size / baseline, 3)}
+            for name, size in variants.items()
+        },
+        "feed_page_bytes": {
+            "baseline": baseline * PAGE_SIZE,
+            **{name: size * PAGE_SIZE for name, size in variants.items()},
+        },
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
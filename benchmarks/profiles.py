@@ -0,0 +1,119 @@
+"""Пропускная способность страниц в профилях настроек dev и prod.
+
+Одна база заполняется командой seed_data, затем для каждого профиля
+запускается отдельный процесс: профиль настроек нельзя сменить внутри
+уже настроенного Django. Процесс запрашивает страницы лент тестовым
+клиентом с адреса 127.0.0.1 (в dev на нём работает debug-toolbar) при
+отключённом кэше страниц и считает запросы в секунду.
+
+    python -m benchmarks.profiles --posts 10000 --requests 200
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROFILES = ("yatube.settings.dev", "yatube.settings.prod")
+DUMMY_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+}
+
+
+def seed(posts):
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+
+    with override_settings(CACHES=DUMMY_CACHES):
+        call_command("migrate", verbosity=0)
+        call_command(
+            "seed_data",
+            users=max(posts // 50, 10),
+            groups=20,
+            posts=posts,
+            comments=posts,
+            follows=20,
+            stdout=io.StringIO(),
+        )
+
+
+def measure(requests):
+    """Запросы в секунду для страниц лент в текущем профиле."""
+    from django.test import Client
+    from django.test.utils import override_settings
+    from django.urls import reverse
+
+    from posts.models import Post
+
+    post = Post.objects.select_related("author").first()
+    urls = {
+        "index": reverse("index"),
+        "profile": reverse("profile", args=[post.author.username]),
+        "post_view": reverse(
+            "post_view", args=[post.author.username, post.pk]
+        ),
+    }
+    client = Client(REMOTE_ADDR="127.0.0.1")
+    results = {}
+    with override_settings(CACHES=DUMMY_CACHES, QUERY_BUDGETS={}):
+        for name, url in urls.items():
+            assert client.get(url).status_code == 200, url
+            started = time.perf_counter()
+            for _ in range(requests):
+                client.get(url)
+            results[name] = round(
+                requests / (time.perf_counter() - started), 1
+            )
+    return results
+
+
+def run_profile(profile, database, requests):
+    env = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": profile,
+        "DATABASE_PATH": database,
+        "DJANGO_SECRET_KEY": "benchmark",
+        "DJANGO_ALLOWED_HOSTS": "testserver",
+    }
+    output = subprocess.run(
+        [
+            sys.executable, "-m", "benchmarks.profiles",
+            "--measure", "--requests", str(requests),
+        ],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--measure", action="store_true",
+                        help="замер в текущем профиле (служебный режим)")
+    args = parser.parse_args()
+
+    from benchmarks import setup
+
+    if args.measure:
+        setup()
+        print(json.dumps(measure(args.requests)))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "db.sqlite3")
+        os.environ["DATABASE_PATH"] = database
+        setup()
+        seed(args.posts)
+        results = {
+            profile: run_profile(profile, database, args.requests)
+            for profile in PROFILES
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Время страниц лент на синтетических данных разного объёма.
+
+Для каждого размера создаётся отдельная база SQLite, заполняется
+командой seed_data, после чего каждая страница запрашивается через
+тестовый клиент с отключённым кэшем и DEBUG = False. Замеряются число
+SQL-запросов, время в базе и полное время ответа (медиана из --repeat
+попыток).
+Результат пишется в JSON вместе с хэшем коммита, чтобы сравнивать
+замеры разных версий.
+
+    python -m benchmarks.queries --sizes 10000,100000 --output bench.json
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+
+from benchmarks import setup
+
+
+def seed(size):
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+    call_command(
+        "seed_data",
+        users=max(size // 50, 10),
+        groups=20,
+        posts=size,
+        comments=size,
+        follows=20,
+        stdout=io.StringIO(),
+    )
+
+
+def pages():
+    """Адреса страниц и пользователь, от имени которого они запрашиваются."""
+    from django.db.models import Count
+    from django.urls import reverse
+
+    from posts.models import Comment, Group, Post, UserStats
+
+    author = UserStats.objects.order_by("-posts_count").first().user
+    reader = UserStats.objects.order_by("-following_count").first().user
+    group = Group.objects.annotate(total=Count("posts")).order_by(
+        "-total"
+    ).first()
+    post_id = Comment.objects.values("post").annotate(
+        total=Count("pk")
+    ).order_by("-total").values_list("post", flat=True).first()
+    post = Post.objects.select_related("author").get(pk=post_id)
+    return {
+        "index": (reverse("index"), None),
+        "group_post": (reverse("group_post", args=[group.slug]), None),
+        "profile": (reverse("profile", args=[author.username]), None),
+        "post_view": (
+            reverse("post_view", args=[post.author.username, post.pk]), None
+        ),
+        "follow_index": (reverse("follow_index"), reader),
+        "search": (f"{reverse('search')}?q=кот", None),
+    }
+
+
+def measure(client, url, repeat):
+    from django.db import connection
+
+    from yatube.middleware import QueryStats
+
+    totals, db_times = [], []
+    for _ in range(repeat):
+        stats = QueryStats()
+        started = time.perf_counter()
+        with connection.execute_wrapper(stats):
+            response = client.get(url)
+        totals.append(time.perf_counter() - started)
+        db_times.append(stats.duration)
+    assert response.status_code == 200, (url, response.status_code)
+    return response, {
+        "queries": stats.count,
+        "db_ms": round(statistics.median(db_times) * 1000, 2),
+        "total_ms": round(statistics.median(totals) * 1000, 2),
+    }
+
+
+def run_size(repeat):
+    from django.test import Client
+
+    results = {}
+    for name, (url, user) in pages().items():
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        response, results[name] = measure(client, url, repeat)
+        if name in ("index", "follow_index"):
+            # Пятая страница — последняя по номеру, дальше идут курсоры.
+            response, results[f"{name}_page5"] = measure(
+                client, f"{url}?page=5", repeat
+            )
+            cursor = response.context["page"].next_cursor
+            if cursor:
+                _, results[f"{name}_cursor"] = measure(
+                    client, f"{url}?after={cursor}", repeat
+                )
+    return results
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="число постов через запятую")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="файл для JSON вместо stdout")
+    args = parser.parse_args()
+    setup()
+    from django.db import connection
+    from django.test.utils import override_settings
+
+    results = {"commit": commit(), "sizes": {}}
+    dummy = {
+        "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+    }
+    with tempfile.TemporaryDirectory() as directory, \
+            override_settings(CACHES=dummy, DEBUG=False, QUERY_BUDGETS={}):
+        for size in (int(size) for size in args.sizes.split(",")):
+            connection.close()
+            connection.settings_dict["NAME"] = os.path.join(
+                directory, f"{size}.sqlite3"
+            )
+            started = time.perf_counter()
+            seed(size)
+            results["sizes"][size] = {
+                "seed_s": round(time.perf_counter() - started, 1),
+                "pages": run_size(args.repeat),
+            }
+        connection.close()
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
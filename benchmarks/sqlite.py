@@ -0,0 +1,147 @@
+"""Пропускная способность SQLite при одновременных чтении и записи.
+
+Несколько процессов-читателей запрашивают первую страницу ленты, а
+процессы-писатели добавляют комментарии, как воркеры gunicorn. После
+каждой операции соединение закрывается так же, как в конце запроса:
+при CONN_MAX_AGE = 0 закрывается всегда, иначе переиспользуется.
+
+Сравниваются профили:
+
+* shipped — прежние настройки: журнал DELETE, synchronous=FULL,
+  новое соединение на каждый запрос;
+* tuned — SQLITE_PRAGMAS из настроек и постоянные соединения.
+
+    python -m benchmarks.sqlite --readers 4 --writers 2 --duration 5
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmarks import setup
+
+DUMMY_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+}
+PROFILES = {
+    "shipped": {
+        "PRAGMAS": {"journal_mode": "DELETE", "synchronous": "FULL"},
+        "CONN_MAX_AGE": 0,
+    },
+    "tuned": None,
+}
+
+
+def profile_settings(name):
+    from django.conf import settings
+
+    if PROFILES[name] is not None:
+        return PROFILES[name]
+    default = settings.DATABASES["default"]
+    return {
+        "PRAGMAS": settings.SQLITE_PRAGMAS,
+        "CONN_MAX_AGE": default["CONN_MAX_AGE"] or 60,
+    }
+
+
+def configure(path, profile):
+    """Направляет соединение default в базу замера с настройками профиля."""
+    from django.db import connection
+
+    connection.close()
+    connection.settings_dict.update(NAME=path, **profile_settings(profile))
+
+
+def prepare(path):
+    from django.core.management import call_command
+    from django.db import connection
+
+    configure(path, "shipped")
+    call_command("migrate", verbosity=0)
+    call_command(
+        "seed_data", users=50, groups=5, posts=5000, comments=5000,
+        follows=5, stdout=io.StringIO(),
+    )
+    connection.close()
+
+
+def worker(args):
+    path, profile, role, duration, seed = args
+    setup()
+    import random
+
+    from django.db import OperationalError, close_old_connections
+    from django.test.utils import override_settings
+
+    from posts.models import Comment, Post
+
+    configure(path, profile)
+    rnd = random.Random(seed)
+    ops = errors = 0
+    deadline = time.perf_counter() + duration
+    with override_settings(CACHES=DUMMY_CACHES):
+        last_post = Post.objects.order_by("-pk").values_list(
+            "pk", flat=True
+        ).first()
+        close_old_connections()
+        while time.perf_counter() < deadline:
+            try:
+                if role == "reader":
+                    list(Post.objects.select_related("author", "group")[:10])
+                else:
+                    Comment.objects.create(
+                        post_id=rnd.randint(1, last_post),
+                        author_id=1,
+                        text="benchmark",
+                    )
+                ops += 1
+            except OperationalError:
+                errors += 1
+            close_old_connections()
+    return role, ops, errors
+
+
+def run_profile(directory, profile, readers, writers, duration):
+    path = os.path.join(directory, f"{profile}.sqlite3")
+    prepare(path)
+    jobs = [
+        (path, profile, "reader", duration, seed) for seed in range(readers)
+    ] + [
+        (path, profile, "writer", duration, seed) for seed in range(writers)
+    ]
+    with multiprocessing.Pool(len(jobs)) as pool:
+        results = pool.map(worker, jobs)
+    totals = {}
+    for role, ops, errors in results:
+        total = totals.setdefault(role, {"ops": 0, "errors": 0})
+        total["ops"] += ops
+        total["errors"] += errors
+    for total in totals.values():
+        total["ops_per_sec"] = round(total["ops"] / duration)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+    setup()
+    from django.test.utils import override_settings
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory, \
+            override_settings(CACHES=DUMMY_CACHES):
+        for profile in PROFILES:
+            results[profile] = run_profile(
+                directory, profile, args.readers, args.writers, args.duration
+            )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
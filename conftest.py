@@ -0,0 +1,16 @@
+"""Общие настройки pytest для тестов проекта.
+
+Включает те же настройки тестового запуска, что и TEST_RUNNER для
+manage.py test: строгие бюджеты запросов и временный файл кэша.
+"""
+from yatube.test_runner import TestSettings
+
+_test_settings = TestSettings()
+
+
+def pytest_configure(config):
+    _test_settings.enable()
+
+
+def pytest_unconfigure(config):
+    _test_settings.disable()
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from posts.models import Comment, Follow, Group, Post
+from posts.models import Comment, Follow, Group, Post, UserStats
+from posts.search import filter_posts, to_match
 
 
 class CommentAdmin(admin.ModelAdmin):
@@ -35,8 +36,33 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск идёт по полнотекстовому индексу, а не LIKE по всей таблице.
+        if not to_match(search_term):
+            return queryset, False
+        return filter_posts(queryset, search_term), False
+
+    def save_model(self, request, obj, form, change):
+        # Как и в post_edit, сохраняются только изменённые поля: счётчик
+        # комментариев из загруженной копии поста не перезаписывается.
+        if change:
+            obj.save(update_fields=[*form.changed_data, "updated"])
+        else:
+            super().save_model(request, obj, form, change)
+
+
+class UserStatsAdmin(admin.ModelAdmin):
+    """Модель для отображения счётчиков пользователя в админке."""
+
+    list_display = (
+        "user", "posts_count", "followers_count", "following_count"
+    )
+    search_fields = ("user__username",)
+    empty_value_display = "-пусто-"
+
 
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Post, PostAdmin)
+admin.site.register(UserStats, UserStatsAdmin)
@@ -0,0 +1,129 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from posts.models import PageGeneration
+
+VERSION_KEY = "posts_version.{}.{}"
+# Страницы живут долго: устаревание отслеживается поколением данных.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+
+
+def get_generation():
+    """Возвращает поколение данных для ключей кэша страниц.
+
+    Поколение читается из той же базы, что и данные страницы: из
+    реплики, закреплённой за запросом, или из основной базы.
+    """
+    return PageGeneration.current()
+
+
+def bump_generation():
+    """Делает устаревшими все закэшированные страницы.
+
+    Поколение меняется в текущей транзакции: параллельный запрос до
+    коммита видит старые данные под старым поколением, а реплика
+    получает новое поколение вместе с изменёнными данными.
+    """
+    PageGeneration.bump()
+
+
+def cache_page_versioned(timeout=PAGE_CACHE_TIMEOUT, key_prefix=""):
+    """Аналог cache_page, в ключ которого входит поколение данных.
+
+    Страницы содержат данные текущего пользователя, поэтому кэш
+    разделяется по cookie: заголовок Vary должен быть выставлен до того,
+    как ответ попадёт в кэш, а SessionMiddleware добавляет его позже.
+    """
+    def decorator(view):
+        varying_view = vary_on_cookie(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            prefix = f"{key_prefix}.{get_generation()}"
+            cached_view = cache_page(timeout, key_prefix=prefix)(varying_view)
+            return cached_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_versions(scopes):
+    """Возвращает версии страниц объектов scopes — пар (вид, id)."""
+    keys = [VERSION_KEY.format(*scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # Как и у поколения, начальное значение берётся из времени.
+        initial = int(time.time() * 1000)
+        for key in missing:
+            cache.add(key, initial, None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key) for key in keys]
+
+
+def _incr_versions(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Ключа нет: get_versions возьмёт новое значение из времени.
+            pass
+
+
+def bump_versions(scopes):
+    """Меняет версии страниц объектов scopes, пропуская пустые id.
+
+    Как и bump_generation, увеличивает версии до и после коммита.
+    """
+    keys = {VERSION_KEY.format(*scope) for scope in scopes if scope[1]}
+    _incr_versions(keys)
+    transaction.on_commit(lambda: _incr_versions(keys))
+
+
+def condition_versioned(get_scopes):
+    """Отвечает 304 Not Modified, если версии страницы не изменились.
+
+    get_scopes(*args, **kwargs) получает аргументы представления и
+    возвращает пары (вид, id), от которых зависит страница, или None,
+    если объекта нет. ETag складывается из их версий и отпечатка
+    cookie сессии, потому что страница зависит от пользователя.
+    """
+    def etag(request, *args, **kwargs):
+        scopes = get_scopes(*args, **kwargs)
+        if scopes is None:
+            return None
+        session = hashlib.sha1(request.COOKIES.get(
+            settings.SESSION_COOKIE_NAME, ""
+        ).encode()).hexdigest()[:12]
+        versions = "-".join(str(version) for version in get_versions(scopes))
+        return f"{session}-{versions}"
+    return condition(etag_func=etag)
+
+
+POST_CARD_TEMPLATE = "incudes/post_item.html"
+POST_CARD_TIMEOUT = 60 * 60 * 24
+
+
+def post_card_key(post, is_owner):
+    """Ключ карточки поста: меняется при правке поста и новых комментариях.
+
+    В ключ входят имя автора и сообщество: переименование пользователя
+    и удаление сообщества поля updated постов не меняют. Автору карточка
+    показывает ссылку на редактирование, поэтому для него хранится
+    отдельный вариант.
+    """
+    return "post_card.{}.{}.{}.{}.{}.{:d}".format(
+        post.pk,
+        post.updated.timestamp(),
+        post.comments_count,
+        post.author.username,
+        post.group_id,
+        is_owner,
+    )
@@ -0,0 +1,105 @@
+"""Потоковая выгрузка постов автора и комментариев к ним.
+
+Записи читаются QuerySet.iterator частями по CHUNK_SIZE строк, переводятся
+в CSV или JSONL и отдаются блоками по BLOCK_SIZE байт, при необходимости
+сжимаясь gzip на лету. Память не зависит от числа постов автора.
+Строки JSONL совпадают с форматом команды import_jsonl.
+"""
+import csv
+import io
+import json
+import zlib
+
+from posts.models import Comment
+
+EXPORT_FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+CSV_FIELDS = ("type", "id", "post", "author", "group", "text", "date")
+CHUNK_SIZE = 2000
+BLOCK_SIZE = 64 * 1024
+
+
+def export_rows(author, chunk_size=CHUNK_SIZE):
+    """Посты автора, затем комментарии к ним, в виде словарей."""
+    posts = author.posts.order_by("pk").values_list(
+        "pk", "group__slug", "text", "pub_date"
+    )
+    for pk, group, text, pub_date in posts.iterator(chunk_size):
+        yield {
+            "type": "post",
+            "id": pk,
+            "author": author.username,
+            "group": group,
+            "text": text,
+            "pub_date": pub_date.isoformat(),
+        }
+    comments = Comment.objects.filter(post__author=author).order_by(
+        "pk"
+    ).values_list("pk", "post_id", "author__username", "text", "created")
+    for pk, post, username, text, created in comments.iterator(chunk_size):
+        yield {
+            "type": "comment",
+            "id": pk,
+            "post": post,
+            "author": username,
+            "text": text,
+            "created": created.isoformat(),
+        }
+
+
+def to_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def to_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        writer.writerow(values)
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    yield line(CSV_FIELDS)
+    for row in rows:
+        yield line((
+            row["type"], row["id"], row.get("post", ""), row["author"],
+            row.get("group") or "", row["text"],
+            row.get("pub_date") or row.get("created"),
+        ))
+
+
+def blocks(lines, size=BLOCK_SIZE):
+    """Склеивает строки в блоки байтов не меньше size."""
+    block = []
+    length = 0
+    for line in lines:
+        data = line.encode()
+        block.append(data)
+        length += len(data)
+        if length >= size:
+            yield b"".join(block)
+            block = []
+            length = 0
+    if block:
+        yield b"".join(block)
+
+
+def gzipped(chunks):
+    """Сжимает поток байтов в формат gzip."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(author, export_format="jsonl", compress=False):
+    """Поток байтов выгрузки автора в формате export_format."""
+    rows = export_rows(author)
+    lines = to_csv(rows) if export_format == "csv" else to_jsonl(rows)
+    stream = blocks(lines)
+    return gzipped(stream) if compress else stream
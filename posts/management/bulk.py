@@ -0,0 +1,36 @@
+"""Общие помощники команд массовой загрузки данных."""
+import itertools
+from contextlib import contextmanager
+
+from django.core.management.color import no_style
+from django.db import connection
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Позволяет задать значения полей с auto_now_add при вставке."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def batches(objects, size):
+    """Разбивает поток объектов на списки по size штук."""
+    objects = iter(objects)
+    while True:
+        batch = list(itertools.islice(objects, size))
+        if not batch:
+            return
+        yield batch
+
+
+def reset_sequences(*models):
+    """Сдвигает счётчики id после вставки записей с явными id."""
+    sql = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for statement in sql:
+            cursor.execute(statement)
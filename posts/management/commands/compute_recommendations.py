@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.recommendations import (
+    RECOMMENDATIONS_LIMIT, refresh, refresh_queued
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает рекомендации «на кого подписаться» по графу "
+        "подписок: для всех пользователей или только из очереди."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental", action="store_true",
+            help="пересчитать только пользователей, сменивших подписки",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=RECOMMENDATIONS_LIMIT,
+            help="сколько рекомендаций хранить для пользователя",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options["incremental"]:
+            users = refresh_queued(options["limit"])
+        else:
+            users = refresh(options["limit"])
+        self.stdout.write(
+            f"Рекомендации пересчитаны для {users} пользователей "
+            f"за {time.perf_counter() - started:.1f} с."
+        )
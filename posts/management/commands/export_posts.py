@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import EXPORT_FORMATS, export
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = "Выгружает посты автора и комментарии к ним в CSV или JSONL."
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument(
+            "--format", dest="export_format", choices=EXPORT_FORMATS,
+            default="jsonl",
+        )
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument(
+            "--output", help="файл для выгрузки, по умолчанию stdout"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(
+                f"Пользователь {options['username']} не найден."
+            )
+        chunks = export(author, options["export_format"], options["gzip"])
+        if options["output"]:
+            with open(options["output"], "wb") as file:
+                for chunk in chunks:
+                    file.write(chunk)
+        elif options["gzip"]:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending="")
@@ -0,0 +1,265 @@
+"""Потоковая загрузка пользователей, сообществ, постов и комментариев.
+
+Каждая строка файла — JSON-объект с полем type:
+
+    {"type": "user", "username": "leo", "email": "leo@example.com"}
+    {"type": "group", "slug": "cats", "title": "Коты", "description": ""}
+    {"type": "post", "id": 1, "author": "leo", "group": "cats",
+     "text": "...", "pub_date": "2020-01-01T10:00:00+00:00"}
+    {"type": "comment", "post": 1, "author": "leo", "text": "...",
+     "created": "2020-01-01T11:00:00+00:00"}
+
+Файл читается пачками по --batch-size строк, каждая пачка вставляется
+bulk_create в своей транзакции, после чего в файл контрольной точки
+пишется позиция в файле. Повторный запуск продолжает с этой позиции.
+
+Id записей задаются явно: к номеру строки (а для постов — к id из файла)
+прибавляется сдвиг, запомненный в контрольной точке. Поэтому пачка,
+вставленная до падения, но не отмеченная в контрольной точке, при
+повторе не задваивается: конфликты по id пропускаются. В памяти держатся
+только словари имя пользователя -> id и адрес сообщества -> id.
+"""
+import json
+import os
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.management.bulk import explicit_dates, reset_sequences
+from posts.models import Comment, Group, Post, User
+
+BATCH_SIZE = 5000
+MODELS = {"user": User, "group": Group, "post": Post, "comment": Comment}
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f"Неверная дата: {value}")
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает пользователей, сообщества, посты и комментарии "
+        "из файла JSONL с возможностью продолжить прерванную загрузку."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--checkpoint",
+            help="файл контрольной точки, по умолчанию <path>.checkpoint",
+        )
+        parser.add_argument(
+            "--no-rebuild", action="store_true",
+            help="не пересчитывать счётчики, ленты и поиск после загрузки",
+        )
+
+    def handle(self, *args, **options):
+        self.checkpoint = (
+            options["checkpoint"] or f"{options['path']}.checkpoint"
+        )
+        state = self.load_state()
+        self.offsets = state["offsets"]
+        self.users = {}
+        self.groups = {}
+        self.counts = dict.fromkeys(MODELS, 0)
+        self.skipped = 0
+        started = time.perf_counter()
+        read = 0
+
+        with open(options["path"], "rb") as file:
+            file.seek(state["position"])
+            line_no = state["line"]
+            while True:
+                chunk = []
+                for _ in range(options["batch_size"]):
+                    line = file.readline()
+                    if not line:
+                        break
+                    line_no += 1
+                    if line.strip():
+                        chunk.append((line_no, self.parse(line, line_no)))
+                if chunk:
+                    with transaction.atomic():
+                        self.import_chunk(chunk)
+                    read += len(chunk)
+                state.update(position=file.tell(), line=line_no)
+                self.save_state(state)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"Строк: {line_no} "
+                    f"({read / elapsed if elapsed else 0:.0f} строк/с)."
+                )
+                if not line:
+                    break
+
+        os.remove(self.checkpoint)
+        self.stdout.write(
+            "Загружено: " + ", ".join(
+                f"{MODELS[kind]._meta.verbose_name_plural} {count}"
+                for kind, count in self.counts.items()
+            ) + f"; пропущено строк: {self.skipped}."
+        )
+        if not options["no_rebuild"]:
+            for command in (
+                    "reconcile_counters", "rebuild_feeds",
+                    "rebuild_search_index",
+            ):
+                call_command(command, stdout=self.stdout)
+
+    def load_state(self):
+        if os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as file:
+                state = json.load(file)
+            self.stdout.write(f"Продолжение со строки {state['line'] + 1}.")
+            return state
+        return {
+            "position": 0,
+            "line": 0,
+            "offsets": {
+                kind: model.objects.aggregate(last=Max("pk"))["last"] or 0
+                for kind, model in MODELS.items()
+            },
+        }
+
+    def save_state(self, state):
+        # Запись через временный файл: контрольная точка не бывает
+        # наполовину записанной, даже если процесс упал посреди записи.
+        temporary = f"{self.checkpoint}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(state, file)
+        os.replace(temporary, self.checkpoint)
+
+    def parse(self, line, line_no):
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            raise CommandError(f"Строка {line_no}: {error}")
+        if not isinstance(row, dict) or row.get("type") not in MODELS:
+            raise CommandError(f"Строка {line_no}: неизвестный тип записи.")
+        return row
+
+    def import_chunk(self, chunk):
+        rows = {kind: [] for kind in MODELS}
+        for line_no, row in chunk:
+            rows[row["type"]].append((line_no, row))
+        try:
+            self.import_users(rows["user"])
+            self.import_groups(rows["group"])
+            self.import_posts(rows["post"])
+            self.import_comments(rows["comment"])
+        except (KeyError, TypeError, ValueError) as error:
+            raise CommandError(
+                f"Ошибка в строках {chunk[0][0]}-{chunk[-1][0]}: {error!r}"
+            )
+        reset_sequences(*MODELS.values())
+
+    def insert(self, kind, objects):
+        MODELS[kind].objects.bulk_create(objects, ignore_conflicts=True)
+        self.counts[kind] += len(objects)
+
+    def resolve(self, mapping, model, field, keys):
+        """Дополняет mapping id записей model с field из keys."""
+        missing = {key for key in keys if key and key not in mapping}
+        if missing:
+            mapping.update(model.objects.filter(
+                **{f"{field}__in": missing}
+            ).values_list(field, "pk"))
+
+    def import_users(self, rows):
+        if not rows:
+            return
+        unusable = make_password(None)
+        self.insert("user", [
+            User(
+                pk=self.offsets["user"] + line_no,
+                username=row["username"],
+                email=row.get("email", ""),
+                first_name=row.get("first_name", ""),
+                last_name=row.get("last_name", ""),
+                password=row.get("password") or unusable,
+            )
+            for line_no, row in rows
+        ])
+        # Пользователь мог существовать до загрузки: его id берётся из базы.
+        self.resolve(
+            self.users, User, "username", [row["username"] for _, row in rows]
+        )
+
+    def import_groups(self, rows):
+        if not rows:
+            return
+        self.insert("group", [
+            Group(
+                pk=self.offsets["group"] + line_no,
+                slug=row["slug"],
+                title=row.get("title") or row["slug"],
+                description=row.get("description", ""),
+            )
+            for line_no, row in rows
+        ])
+        self.resolve(
+            self.groups, Group, "slug", [row["slug"] for _, row in rows]
+        )
+
+    def import_posts(self, rows):
+        if not rows:
+            return
+        self.resolve(
+            self.users, User, "username", [row["author"] for _, row in rows]
+        )
+        self.resolve(
+            self.groups, Group, "slug", [row.get("group") for _, row in rows]
+        )
+        posts = []
+        for _, row in rows:
+            if row["author"] not in self.users:
+                self.skipped += 1
+                continue
+            posts.append(Post(
+                pk=self.offsets["post"] + int(row["id"]),
+                author_id=self.users[row["author"]],
+                group_id=self.groups.get(row.get("group")),
+                text=row["text"],
+                pub_date=parse_date(row.get("pub_date")),
+            ))
+        with explicit_dates(Post._meta.get_field("pub_date")):
+            self.insert("post", posts)
+
+    def import_comments(self, rows):
+        if not rows:
+            return
+        self.resolve(
+            self.users, User, "username", [row["author"] for _, row in rows]
+        )
+        post_ids = set(Post.objects.filter(pk__in={
+            self.offsets["post"] + int(row["post"]) for _, row in rows
+        }).values_list("pk", flat=True))
+        comments = []
+        for line_no, row in rows:
+            post_id = self.offsets["post"] + int(row["post"])
+            if row["author"] not in self.users or post_id not in post_ids:
+                self.skipped += 1
+                continue
+            comments.append(Comment(
+                pk=self.offsets["comment"] + line_no,
+                post_id=post_id,
+                author_id=self.users[row["author"]],
+                text=row["text"],
+                created=parse_date(row.get("created")),
+            ))
+        with explicit_dates(Comment._meta.get_field("created")):
+            self.insert("comment", comments)
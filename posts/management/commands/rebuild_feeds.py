@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import FeedEntry, Follow
+
+
+class Command(BaseCommand):
+    help = "Заново раскладывает посты по лентам подписчиков."
+
+    def handle(self, *args, **options):
+        follows = Follow.objects.values_list("user_id", "author_id")
+        with transaction.atomic():
+            FeedEntry.objects.all().delete()
+            for user_id, author_id in follows.iterator():
+                FeedEntry.backfill(user_id, author_id)
+        self.stdout.write(
+            f"Записей в лентах: {FeedEntry.objects.count()}."
+        )
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Post, User, UserStats
+
+BATCH_SIZE = 1000
+
+
+def count_by(model, field):
+    """Подзапрос с количеством строк model, ссылающихся на запись."""
+    rows = (
+        model.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает денормализованные счётчики пользователей и постов."
+
+    def handle(self, *args, **options):
+        self.reconcile_users()
+        self.reconcile_posts()
+
+    def reconcile_users(self):
+        users = User.objects.annotate(
+            real_posts=count_by(Post, "author"),
+            real_followers=count_by(Follow, "author"),
+            real_following=count_by(Follow, "user"),
+        ).values_list(
+            "pk",
+            "real_posts",
+            "real_followers",
+            "real_following",
+            "stats__user",
+            "stats__posts_count",
+            "stats__followers_count",
+            "stats__following_count",
+        )
+        missing, drifted = [], []
+        for pk, *real, stats_pk, posts, followers, following in (
+                users.iterator(chunk_size=BATCH_SIZE)):
+            stats = UserStats(
+                user_id=pk,
+                posts_count=real[0],
+                followers_count=real[1],
+                following_count=real[2],
+            )
+            if stats_pk is None:
+                missing.append(stats)
+            elif real != [posts, followers, following]:
+                drifted.append(stats)
+
+        with transaction.atomic():
+            UserStats.objects.bulk_create(missing, batch_size=BATCH_SIZE)
+            UserStats.objects.bulk_update(
+                drifted,
+                ["posts_count", "followers_count", "following_count"],
+                batch_size=BATCH_SIZE,
+            )
+        self.stdout.write(
+            f"Создано записей: {len(missing)}, "
+            f"исправлено записей: {len(drifted)}."
+        )
+
+    def reconcile_posts(self):
+        drifted = [
+            Post(pk=pk, comments_count=real)
+            for pk, real in Post.objects.annotate(
+                real_comments=count_by(Comment, "post")
+            ).exclude(
+                comments_count=F("real_comments")
+            ).values_list("pk", "real_comments").iterator(
+                chunk_size=BATCH_SIZE
+            )
+        ]
+        Post.objects.bulk_update(
+            drifted, ["comments_count"], batch_size=BATCH_SIZE
+        )
+        self.stdout.write(f"Исправлено постов: {len(drifted)}.")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.trending import rollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает популярные посты и сообщества из почасовых "
+        "счётчиков активности."
+    )
+
+    def handle(self, *args, **options):
+        posts, groups = rollup()
+        self.stdout.write(
+            f"Популярных постов: {posts}, сообществ: {groups}."
+        )
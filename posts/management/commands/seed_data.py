@@ -0,0 +1,207 @@
+import bisect
+import itertools
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from posts.management.bulk import batches, explicit_dates, reset_sequences
+from posts.models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 5000
+# Показатель степенного закона: у первых авторов по популярности
+# большая часть подписчиков и постов, у остальных — длинный хвост.
+POPULARITY_EXPONENT = 1.2
+SEED_PASSWORD = "password"
+WORDS = (
+    "город утро река дорога книга кофе музыка лес море поезд солнце дождь "
+    "друг работа вечер кот собака окно свет дом сад зима лето осень весна "
+    "новости история фото прогулка встреча идея проект код сайт блог"
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу синтетическими пользователями, сообществами, "
+        "постами, комментариями и подписками."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=100000)
+        parser.add_argument("--comments", type=int, default=200000)
+        parser.add_argument(
+            "--follows", type=int, default=20,
+            help="среднее число подписок пользователя",
+        )
+        parser.add_argument(
+            "--days", type=int, default=365,
+            help="за сколько дней распределить даты постов",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options["users"] < 1:
+            raise CommandError("Нужен хотя бы один пользователь.")
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=options["days"])
+        started = time.perf_counter()
+
+        users = self.seed_users(options["users"])
+        groups = self.seed_groups(options["groups"])
+        # Веса популярности одни для постов и для подписчиков.
+        popular = users[:]
+        self.random.shuffle(popular)
+        weights = list(itertools.accumulate(
+            1 / (rank + 1) ** POPULARITY_EXPONENT
+            for rank in range(len(popular))
+        ))
+        posts = self.seed_posts(options["posts"], popular, weights, groups)
+        self.seed_comments(options["comments"], posts, users)
+        self.seed_follows(options["follows"], users, popular, weights)
+        reset_sequences(User, Group, Post)
+
+        for command in (
+                "reconcile_counters", "rebuild_feeds", "rebuild_search_index"
+        ):
+            call_command(command, stdout=self.stdout)
+        self.stdout.write(
+            f"Готово за {time.perf_counter() - started:.1f} с."
+        )
+
+    def next_id(self, model):
+        return (model.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+
+    def insert(self, model, objects):
+        """Вставляет объекты пачками, каждую в своей транзакции."""
+        started = time.perf_counter()
+        total = 0
+        for batch in batches(objects, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            total += len(batch)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{model._meta.verbose_name_plural}: {total} "
+            f"({total / elapsed if elapsed else 0:.0f} строк/с)."
+        )
+
+    def seed_users(self, count):
+        first = self.next_id(User)
+        # Хэш пароля считается один раз: make_password намеренно медленный.
+        password = make_password(SEED_PASSWORD)
+        ids = list(range(first, first + count))
+        self.insert(User, (
+            User(
+                pk=pk,
+                username=f"seed{pk}",
+                email=f"seed{pk}@example.com",
+                password=password,
+            )
+            for pk in ids
+        ))
+        return ids
+
+    def seed_groups(self, count):
+        first = self.next_id(Group)
+        ids = list(range(first, first + count))
+        self.insert(Group, (
+            Group(
+                pk=pk,
+                title=f"Сообщество {pk}",
+                slug=f"seed-{pk}",
+                description=f"Описание сообщества {pk}",
+            )
+            for pk in ids
+        ))
+        return ids
+
+    def post_date(self, index, total):
+        """Дата поста: посты равномерно распределены по времени по id."""
+        return self.start + (self.now - self.start) * (index / max(total, 1))
+
+    def seed_posts(self, count, authors, weights, groups):
+        first = self.next_id(Post)
+        total_weight = weights[-1]
+
+        def posts():
+            for index in range(count):
+                author = authors[bisect.bisect(
+                    weights, self.random.random() * total_weight
+                )]
+                group = (
+                    self.random.choice(groups)
+                    if groups and self.random.random() < 0.5 else None
+                )
+                yield Post(
+                    pk=first + index,
+                    text=self.text(),
+                    author_id=author,
+                    group_id=group,
+                    pub_date=self.post_date(index, count),
+                )
+
+        with explicit_dates(Post._meta.get_field("pub_date")):
+            self.insert(Post, posts())
+        return first, count
+
+    def seed_comments(self, count, posts, users):
+        first_post, post_count = posts
+        if not post_count:
+            return
+
+        def comments():
+            for _ in range(count):
+                index = self.random.randrange(post_count)
+                created = self.post_date(index, post_count) + timedelta(
+                    minutes=self.random.randrange(1, 60 * 24)
+                )
+                yield Comment(
+                    post_id=first_post + index,
+                    author_id=self.random.choice(users),
+                    text=self.text(),
+                    created=min(created, self.now),
+                )
+
+        with explicit_dates(Comment._meta.get_field("created")):
+            self.insert(Comment, comments())
+
+    def seed_follows(self, average, users, authors, weights):
+        total_weight = weights[-1]
+        limit = len(authors) - 1
+
+        def follows():
+            for user in users:
+                # Число подписок тоже распределено с длинным хвостом.
+                wanted = min(
+                    limit, int(self.random.paretovariate(2) * average / 2)
+                )
+                chosen = set()
+                for _ in range(wanted * 3):
+                    if len(chosen) >= wanted:
+                        break
+                    author = authors[bisect.bisect(
+                        weights, self.random.random() * total_weight
+                    )]
+                    if author != user:
+                        chosen.add(author)
+                for author in chosen:
+                    yield Follow(user_id=user, author_id=author)
+
+        self.insert(Follow, follows())
+
+    def text(self):
+        return " ".join(
+            self.random.choice(WORDS)
+            for _ in range(self.random.randint(5, 40))
+        )
@@ -0,0 +1,50 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from yatube.routers import PRIMARY_DATABASE
+
+
+class Command(BaseCommand):
+    help = (
+        "Копирует основную базу SQLite в файлы реплик из "
+        "REPLICA_DATABASES или в указанные файлы."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths", nargs="*", help="файлы реплик вместо REPLICA_DATABASES"
+        )
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or [
+            connections.databases[alias]["NAME"]
+            for alias in settings.REPLICA_DATABASES
+        ]
+        if not paths:
+            raise CommandError(
+                "Реплики не настроены: задайте DATABASE_REPLICAS."
+            )
+        primary = connections[PRIMARY_DATABASE]
+        if primary.vendor != "sqlite":
+            raise CommandError("Копирование реплик поддерживается для SQLite.")
+        if primary.in_atomic_block:
+            # Копирование из соединения с открытой записью не завершится.
+            raise CommandError("Команду нельзя вызывать внутри транзакции.")
+        primary.ensure_connection()
+        for path in paths:
+            started = time.perf_counter()
+            # Резервное копирование SQLite пишет в файл реплики на месте
+            # и согласованно даже при одновременной записи в основную базу,
+            # а читатели реплики видят либо старую, либо новую копию.
+            target = sqlite3.connect(path)
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(
+                f"{path}: {time.perf_counter() - started:.2f} с."
+            )
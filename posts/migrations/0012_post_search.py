@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_updated'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "CREATE VIRTUAL TABLE posts_search USING fts5("
+                " text, tokenize = 'unicode61 remove_diacritics 2'"
+                ")",
+                "CREATE VIRTUAL TABLE posts_comment_search USING fts5("
+                " text, post_id UNINDEXED,"
+                " tokenize = 'unicode61 remove_diacritics 2'"
+                ")",
+                "INSERT INTO posts_search (rowid, text) "
+                "SELECT id, text FROM posts_post",
+                "INSERT INTO posts_comment_search (rowid, text, post_id) "
+                "SELECT id, text, post_id FROM posts_comment",
+            ],
+            reverse_sql=[
+                "DROP TABLE posts_comment_search",
+                "DROP TABLE posts_search",
+            ],
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('post', 'Пост'), ('group', 'Сообщество'), ('author', 'Автор')], max_length=10, verbose_name='Вид объекта')),
+                ('object_id', models.PositiveIntegerField(verbose_name='Id объекта')),
+                ('hour', models.DateTimeField(verbose_name='Начало часа')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Событий')),
+            ],
+            options={
+                'verbose_name': 'Счётчик активности',
+                'verbose_name_plural': 'Счётчики активности',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingGroup',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='posts.Group', verbose_name='Сообщество')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+            ],
+            options={
+                'verbose_name': 'Популярное сообщество',
+                'verbose_name_plural': 'Популярные сообщества',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingPost',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='posts.Post', verbose_name='Пост')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Group', verbose_name='Сообщество')),
+            ],
+            options={
+                'verbose_name': 'Популярный пост',
+                'verbose_name_plural': 'Популярные посты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='trendinggroup',
+            index=models.Index(fields=['-score'], name='posts_trendgroup_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitybucket',
+            index=models.Index(fields=['hour'], name='posts_activity_hour_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='activitybucket',
+            unique_together={('kind', 'object_id', 'hour')},
+        ),
+        migrations.AddIndex(
+            model_name='trendingpost',
+            index=models.Index(fields=['-score'], name='posts_trendpost_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trendingpost',
+            index=models.Index(fields=['group', '-score'], name='posts_trendpost_group_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:50
+
+import time
+
+from django.db import migrations, models
+
+
+def create_generation(apps, schema_editor):
+    PageGeneration = apps.get_model("posts", "PageGeneration")
+    PageGeneration.objects.create(pk=1, value=int(time.time() * 1000))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageGeneration',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(verbose_name='Поколение')),
+            ],
+            options={
+                'verbose_name': 'Поколение страниц',
+                'verbose_name_plural': 'Поколения страниц',
+            },
+        ),
+        migrations.RunPython(create_generation, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,11 @@
+import time
+
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connection, connections, models, router, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -44,15 +50,60 @@ class Post(models.Model):
     image = models.ImageField(
         upload_to='posts/', blank=True, null=True, verbose_name="Изображение"
     )
+    updated = models.DateTimeField(
+        auto_now=True, verbose_name="Дата изменения"
+    )
+    # Поддерживается сигналами Comment, чтобы карточки постов в лентах
+    # не считали комментарии отдельным запросом.
+    comments_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Комментариев"
+    )
 
     def __str__(self):
         return self.text
 
+    @classmethod
+    def count_comment(cls, post_id):
+        """Увеличивает счётчик комментариев поста post_id.
+
+        Возвращает id автора и сообщества поста из того же
+        UPDATE ... RETURNING, без отдельного чтения поста.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {cls._meta.db_table} "
+                "SET comments_count = comments_count + 1 "
+                "WHERE id = %s RETURNING author_id, group_id",
+                [post_id],
+            )
+            return cursor.fetchone() or (None, None)
+
+    def save(self, *args, **kwargs):
+        # Счётчики в UserStats обновляются обработчиком post_save,
+        # поэтому сохранение и обработчик выполняются в одной транзакции.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
 
         verbose_name = "Публикация"
         verbose_name_plural = "Публикации"
         ordering = ("-pub_date",)
+        # Индексы повторяют сортировку лент, поэтому страница читается
+        # диапазоном индекса без сортировки.
+        indexes = [
+            models.Index(
+                fields=["-pub_date", "-id"], name="posts_post_date_idx"
+            ),
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="posts_post_author_date_idx",
+            ),
+            models.Index(
+                fields=["group", "-pub_date", "-id"],
+                name="posts_post_group_date_idx",
+            ),
+        ]
 
 
 class Comment(models.Model):
@@ -77,10 +128,21 @@ class Comment(models.Model):
     def __str__(self):
         return self.text
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     class Meta:
 
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
+        ordering = ("created",)
+        indexes = [
+            models.Index(
+                fields=["post", "created"],
+                name="posts_comment_post_created_idx",
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -98,8 +160,429 @@ class Follow(models.Model):
         verbose_name="Автор"
     )
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def follow(cls, user_id, author_id):
+        """Подписывает пользователя на автора одним INSERT.
+
+        Повторная подписка, в том числе из параллельного запроса,
+        пропускается базой. Для новой подписки отправляется post_save,
+        и обработчики обновляют счётчики и ленту как при save().
+        Возвращает True, если подписка создана.
+        """
+        using = router.db_for_write(cls)
+        ops = connections[using].ops
+        with transaction.atomic(using), connections[using].cursor() as cursor:
+            cursor.execute(
+                f"{ops.insert_statement(ignore_conflicts=True)} "
+                f"{cls._meta.db_table} (user_id, author_id) VALUES (%s, %s) "
+                f"{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}",
+                [user_id, author_id],
+            )
+            if cursor.rowcount != 1:
+                return False
+            follow = cls(
+                pk=cursor.lastrowid, user_id=user_id, author_id=author_id
+            )
+            post_save.send(
+                sender=cls, instance=follow, created=True, update_fields=None,
+                raw=False, using=using,
+            )
+        return True
+
+    @classmethod
+    def unfollow(cls, user_id, author_id):
+        """Отписывает пользователя от автора одним DELETE.
+
+        Для удалённой подписки отправляется post_delete. Возвращает True,
+        если подписка была.
+        """
+        using = router.db_for_write(cls)
+        with transaction.atomic(using), connections[using].cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {cls._meta.db_table} "
+                "WHERE user_id = %s AND author_id = %s",
+                [user_id, author_id],
+            )
+            if cursor.rowcount != 1:
+                return False
+            post_delete.send(
+                sender=cls,
+                instance=cls(user_id=user_id, author_id=author_id),
+                using=using,
+            )
+        return True
+
     class Meta:
 
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
         unique_together = ("user", "author")
+
+
+class UserStats(models.Model):
+    """Модель для хранения счётчиков пользователя.
+
+    Счётчики обновляются сигналами при создании и удалении Post и Follow,
+    расхождения исправляет команда reconcile_counters.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="Пользователь"
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name="Записей"
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name="Подписчиков"
+    )
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name="Подписок"
+    )
+
+    def __str__(self):
+        return str(self.user)
+
+    @classmethod
+    def count_for(cls, user_id):
+        """Возвращает фактические значения счётчиков пользователя."""
+        return {
+            "posts_count": Post.objects.filter(author_id=user_id).count(),
+            "followers_count": Follow.objects.filter(
+                author_id=user_id
+            ).count(),
+            "following_count": Follow.objects.filter(
+                user_id=user_id
+            ).count(),
+        }
+
+    @classmethod
+    def recount(cls, user_id):
+        """Пересчитывает счётчики пользователя по исходным таблицам."""
+        stats, _ = cls.objects.update_or_create(
+            user_id=user_id, defaults=cls.count_for(user_id)
+        )
+        return stats
+
+    @classmethod
+    def change(cls, user_id, **deltas):
+        """Атомарно изменяет счётчики пользователя на заданные величины.
+
+        Отсутствующая запись не создаётся: её заполнит for_user или
+        команда reconcile_counters. Разошедшийся счётчик не уходит ниже
+        нуля, чтобы удаление не падало на ограничении поля.
+        """
+        updates = {
+            name: Greatest(F(name) + delta, 0)
+            for name, delta in deltas.items()
+        }
+        cls.objects.filter(user_id=user_id).update(**updates)
+
+    @classmethod
+    def for_user(cls, user):
+        """Возвращает счётчики пользователя, создавая их при отсутствии."""
+        try:
+            return user.stats
+        except cls.DoesNotExist:
+            return cls.recount(user.pk)
+
+    class Meta:
+
+        verbose_name = "Статистика пользователя"
+        verbose_name_plural = "Статистика пользователей"
+
+
+class FeedEntry(models.Model):
+    """Модель записи в ленте подписок пользователя.
+
+    Записи раскладываются подписчикам при публикации поста, поэтому
+    лента читается одним проходом по индексу (user, pub_date).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+        verbose_name="Пользователь"
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+        verbose_name="Публикация"
+    )
+    pub_date = models.DateTimeField(verbose_name="Дата публикации")
+
+    # Сколько последних постов автора попадает в ленту при подписке.
+    BACKFILL_LIMIT = 1000
+
+    @classmethod
+    def _insert_from(cls, select, rows, params):
+        """Вставляет в ленты строки SELECT select FROM (rows).
+
+        Записи копируются одним запросом внутри базы, без создания
+        объектов в Python. Уже существующие записи пропускаются.
+        """
+        sql, rows_params = rows.query.sql_with_params()
+        ops = connection.ops
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"{ops.insert_statement(ignore_conflicts=True)} "
+                f"{cls._meta.db_table} (user_id, post_id, pub_date) "
+                f"SELECT {select} FROM ({sql}) source "
+                f"{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}",
+                [*params, *rows_params],
+            )
+
+    @classmethod
+    def fan_out(cls, post):
+        """Добавляет пост в ленты всех подписчиков автора."""
+        pub_date = cls._meta.get_field("pub_date").get_db_prep_value(
+            post.pub_date, connection
+        )
+        cls._insert_from(
+            "source.user_id, %s, %s",
+            Follow.objects.filter(author_id=post.author_id).values_list(
+                "user_id"
+            ),
+            [post.pk, pub_date],
+        )
+
+    @classmethod
+    def backfill(cls, user_id, author_id, limit=BACKFILL_LIMIT):
+        """Добавляет в ленту пользователя последние посты автора."""
+        cls._insert_from(
+            "%s, source.id, source.pub_date",
+            Post.objects.filter(author_id=author_id).values_list(
+                "pk", "pub_date"
+            )[:limit],
+            [user_id],
+        )
+
+    @classmethod
+    def prune(cls, user_id, author_id):
+        """Удаляет из ленты пользователя посты автора."""
+        cls.objects.filter(user_id=user_id, post__author_id=author_id).delete()
+
+    class Meta:
+
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-post"],
+                name="posts_feed_user_date_idx",
+            ),
+        ]
+
+
+class Recommendation(models.Model):
+    """Модель рекомендации автора для подписки.
+
+    Списки считает команда compute_recommendations по графу подписок,
+    страницы только читают готовые строки.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="recommendations",
+        verbose_name="Пользователь"
+    )
+    candidate = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Рекомендуемый автор"
+    )
+    score = models.FloatField(verbose_name="Оценка")
+    mutual_count = models.PositiveIntegerField(
+        default=0, verbose_name="Подписаны из ваших подписок"
+    )
+
+    class Meta:
+
+        verbose_name = "Рекомендация"
+        verbose_name_plural = "Рекомендации"
+        ordering = ("-score", "id")
+        unique_together = ("user", "candidate")
+        indexes = [
+            models.Index(
+                fields=["user", "-score"],
+                name="posts_recommendation_user_idx",
+            ),
+        ]
+
+
+class RecommendationQueue(models.Model):
+    """Модель очереди пользователей, чьи рекомендации устарели."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="+",
+        verbose_name="Пользователь"
+    )
+
+    @classmethod
+    def mark_stale(cls, user_id):
+        """Ставит в очередь пользователя, сменившего подписки.
+
+        Его подписчиков, для которых изменились друзья друзей, добавляет
+        уже фоновый пересчёт. Уже стоящий в очереди пользователь
+        пропускается.
+        """
+        cls.objects.bulk_create([cls(user_id=user_id)], ignore_conflicts=True)
+
+    class Meta:
+
+        verbose_name = "Устаревшие рекомендации"
+        verbose_name_plural = "Устаревшие рекомендации"
+
+
+class ActivityBucket(models.Model):
+    """Модель счётчика событий объекта за один час.
+
+    Комментарии считаются для поста и его сообщества, новые посты — для
+    сообщества, новые подписчики — для автора. Команда rollup_trending
+    собирает из последних часов списки популярного.
+    """
+    POST = "post"
+    GROUP = "group"
+    AUTHOR = "author"
+    KINDS = (
+        (POST, "Пост"),
+        (GROUP, "Сообщество"),
+        (AUTHOR, "Автор"),
+    )
+
+    kind = models.CharField(
+        max_length=10, choices=KINDS, verbose_name="Вид объекта"
+    )
+    object_id = models.PositiveIntegerField(verbose_name="Id объекта")
+    hour = models.DateTimeField(verbose_name="Начало часа")
+    count = models.PositiveIntegerField(default=0, verbose_name="Событий")
+
+    @classmethod
+    def record(cls, kind, object_id, when=None):
+        """Добавляет событие в счётчик часа when одним UPSERT."""
+        if object_id is None:
+            return
+        hour = (when or timezone.now()).replace(
+            minute=0, second=0, microsecond=0
+        )
+        hour = cls._meta.get_field("hour").get_db_prep_value(
+            hour, connection
+        )
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (kind, object_id, hour, count) "
+                "VALUES (%s, %s, %s, 1) "
+                "ON CONFLICT (kind, object_id, hour) "
+                f"DO UPDATE SET count = {table}.count + 1",
+                [kind, object_id, hour],
+            )
+
+    class Meta:
+
+        verbose_name = "Счётчик активности"
+        verbose_name_plural = "Счётчики активности"
+        unique_together = ("kind", "object_id", "hour")
+        indexes = [
+            models.Index(fields=["hour"], name="posts_activity_hour_idx"),
+        ]
+
+
+class TrendingPost(models.Model):
+    """Модель поста в списке популярного, заполняется rollup_trending."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="trending",
+        verbose_name="Пост"
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="+",
+        verbose_name="Сообщество"
+    )
+    score = models.FloatField(verbose_name="Оценка")
+
+    class Meta:
+
+        verbose_name = "Популярный пост"
+        verbose_name_plural = "Популярные посты"
+        indexes = [
+            models.Index(fields=["-score"], name="posts_trendpost_score_idx"),
+            models.Index(
+                fields=["group", "-score"], name="posts_trendpost_group_idx"
+            ),
+        ]
+
+
+class TrendingGroup(models.Model):
+    """Модель сообщества в списке популярного."""
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="trending",
+        verbose_name="Сообщество"
+    )
+    score = models.FloatField(verbose_name="Оценка")
+
+    class Meta:
+
+        verbose_name = "Популярное сообщество"
+        verbose_name_plural = "Популярные сообщества"
+        indexes = [
+            models.Index(fields=["-score"], name="posts_trendgroup_score_idx"),
+        ]
+
+
+class PageGeneration(models.Model):
+    """Модель поколения данных для ключей кэша страниц.
+
+    Единственная строка меняется в одной транзакции с данными и приходит
+    в реплики вместе с ними, поэтому страница, собранная с отстающей
+    реплики, попадает в кэш под поколением этой реплики.
+    """
+    value = models.BigIntegerField(verbose_name="Поколение")
+
+    @classmethod
+    def _create(cls):
+        # Начальное значение берётся из времени, чтобы после очистки
+        # таблицы не повторить одно из прежних поколений.
+        generation, _ = cls.objects.get_or_create(
+            pk=1, defaults={"value": int(time.time() * 1000)}
+        )
+        return generation.value
+
+    @classmethod
+    def current(cls):
+        """Возвращает поколение из базы чтения текущего запроса."""
+        try:
+            return cls.objects.values_list("value", flat=True).get(pk=1)
+        except cls.DoesNotExist:
+            return cls._create()
+
+    @classmethod
+    def bump(cls):
+        """Увеличивает поколение в текущей транзакции."""
+        if not cls.objects.update(value=F("value") + 1):
+            cls._create()
+
+    class Meta:
+
+        verbose_name = "Поколение страниц"
+        verbose_name_plural = "Поколения страниц"
@@ -0,0 +1,205 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+PAGE_SIZE = 10
+# Количество первых страниц, доступных по номеру. Дальше лента
+# листается только курсором, без COUNT(*) и OFFSET.
+NUMBERED_PAGES = 5
+DEFAULT_ORDERING = ("-pub_date", "-id")
+# Комментарии идут от старых к новым и подгружаются по курсору.
+COMMENTS_PAGE_SIZE = 20
+COMMENT_ORDERING = ("created", "id")
+
+
+class CursorPage(Sequence):
+    """Страница курсорной пагинации."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Пагинатор по ключу сортировки (keyset) вместо OFFSET.
+
+    Курсор хранит значения полей сортировки граничной записи, поэтому
+    каждая страница выбирается одним запросом с условием по индексу
+    и LIMIT, без подсчёта общего количества записей.
+    """
+
+    def __init__(self, object_list, per_page=PAGE_SIZE,
+                 ordering=DEFAULT_ORDERING):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.ordering = ordering
+        self.keys = [
+            (field.lstrip("-"), field.startswith("-")) for field in ordering
+        ]
+
+    def encode_cursor(self, obj):
+        """Возвращает курсор, указывающий на запись obj."""
+        values = []
+        for field, _ in self.keys:
+            value = getattr(obj, field)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            values.append(value)
+        data = json.dumps(values, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(data).decode()
+
+    def load_cursor(self, cursor):
+        """Возвращает список значений из курсора или None, если он испорчен.
+
+        Типы значений не проверяются.
+        """
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, binascii.Error):
+            return None
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            return None
+        return values
+
+    def _field(self, name):
+        """Поле модели или аннотации, по которому идёт сортировка."""
+        query = self.object_list.query
+        if name in query.annotations:
+            return query.annotations[name].output_field
+        if name == "pk":
+            return query.model._meta.pk
+        return query.model._meta.get_field(name)
+
+    def decode_cursor(self, cursor):
+        """Возвращает значения полей из курсора или None, если он испорчен.
+
+        Каждое значение приводится к типу своего поля сортировки: курсор
+        приходит из адреса страницы и может быть подделан.
+        """
+        values = self.load_cursor(cursor)
+        if values is None:
+            return None
+        result = []
+        for value, (name, _) in zip(values, self.keys):
+            try:
+                value = self._field(name).to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                return None
+            if value is None:
+                return None
+            result.append(value)
+        return result
+
+    def _seek(self, values, forward):
+        """Условие «после курсора» (forward) или «до курсора»."""
+        condition = Q()
+        for index, (field, descending) in enumerate(self.keys):
+            lookup = "lt" if descending == forward else "gt"
+            step = Q(**{f"{field}__{lookup}": values[index]})
+            for prev_index, (prev_field, _) in enumerate(self.keys[:index]):
+                step &= Q(**{prev_field: values[prev_index]})
+            condition |= step
+        # Дублирующее условие по первому полю позволяет базе начать
+        # чтение индекса сразу с курсора, а не с начала диапазона.
+        field, descending = self.keys[0]
+        bound = "lte" if descending == forward else "gte"
+        return Q(**{f"{field}__{bound}": values[0]}) & condition
+
+    def page(self, after=None, before=None):
+        """Возвращает страницу после курсора after или до курсора before."""
+        cursor = after or before
+        values = self.decode_cursor(cursor) if cursor else None
+        if values is None:
+            return self._slice(self.object_list.order_by(*self.ordering))
+
+        if after:
+            queryset = self.object_list.filter(self._seek(values, True))
+            page = self._slice(queryset.order_by(*self.ordering))
+            page.previous_cursor = (
+                self.encode_cursor(page[0]) if page else after
+            )
+            return page
+
+        reverse = [
+            field[1:] if field.startswith("-") else f"-{field}"
+            for field in self.ordering
+        ]
+        queryset = self.object_list.filter(self._seek(values, False))
+        rows = list(queryset.order_by(*reverse)[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return CursorPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1]) if rows else before,
+            previous_cursor=(
+                self.encode_cursor(rows[0]) if has_previous else None
+            ),
+        )
+
+    def _slice(self, queryset):
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        return CursorPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1]) if has_next else None,
+        )
+
+
+def paginate(request, queryset, per_page=PAGE_SIZE,
+             ordering=DEFAULT_ORDERING):
+    """Возвращает контекст с постраничным списком записей.
+
+    Первые NUMBERED_PAGES страниц доступны по ?page=N: подсчёт и OFFSET
+    ограничены этим окном. Следующие страницы листаются курсорами
+    ?after= и ?before=.
+    """
+    after = request.GET.get("after")
+    before = request.GET.get("before")
+    if after or before:
+        paginator = CursorPaginator(queryset, per_page, ordering)
+        return {
+            "page": paginator.page(after=after, before=before),
+            "paginator": paginator,
+        }
+
+    limit = per_page * NUMBERED_PAGES
+    ordered = queryset.order_by(*ordering)
+    paginator = Paginator(ordered[:limit], per_page)
+    # COUNT(*) по срезу с аннотациями Django группирует по всем строкам
+    # до LIMIT, поэтому размер окна считается по id из того же индекса.
+    # Лишний id показывает, есть ли записи за окном.
+    ids = ordered.values_list("pk", flat=True)[:limit + 1]
+    overflow = len(ids) > limit
+    paginator.count = min(len(ids), limit)
+    page = paginator.get_page(request.GET.get("page"))
+    page.next_cursor = None
+    if not page.has_next() and overflow:
+        page.next_cursor = CursorPaginator(
+            queryset, per_page, ordering
+        ).encode_cursor(page[len(page) - 1])
+    return {"page": page, "paginator": paginator}
@@ -0,0 +1,206 @@
+"""Рекомендации «на кого подписаться» по графу подписок.
+
+Граф читается в списки смежности: кто на кого подписан и кто подписан
+на автора. Полный пересчёт читает граф целиком, а пересчёт по очереди —
+только подписки, нужные для рекомендаций пересчитываемых пользователей.
+Кандидат набирает очки двумя путями:
+
+* друзья друзей — за каждую подписку пользователя, которая подписана
+  на кандидата, FRIEND_WEIGHT;
+* совместные подписки — за каждую подписку пользователя её
+  CO_FOLLOW_TOP авторов, которых чаще всего читают вместе с ней, с весом
+  CO_FOLLOW_WEIGHT, умноженным на долю её читателей, подписанных на
+  кандидата. Списки считаются один раз на автора и общие для всех его
+  читателей; авторы, у которых читателей больше CO_FOLLOW_MAX_FANS,
+  пропускаются: их читают вместе почти со всеми.
+
+Для каждого пользователя хранятся RECOMMENDATIONS_LIMIT лучших
+кандидатов, на которых он ещё не подписан. Страницы читают готовые
+строки Recommendation и граф не обходят. Рекомендации видны на своей
+странице пользователя и в ленте подписок, поэтому после пересчёта
+меняются версии страниц пересчитанных пользователей и поколение кэша.
+"""
+import heapq
+from collections import Counter, defaultdict
+from itertools import chain
+
+from django.db import transaction
+from django.db.models import Count
+
+from posts.cache import bump_generation, bump_versions
+from posts.management.bulk import batches
+from posts.models import Follow, Recommendation, RecommendationQueue
+
+FRIEND_WEIGHT = 1.0
+CO_FOLLOW_WEIGHT = 0.5
+CO_FOLLOW_MAX_FANS = 1000
+CO_FOLLOW_TOP = 50
+RECOMMENDATIONS_LIMIT = 10
+BATCH_SIZE = 500
+
+
+class FollowGraph:
+    """Граф подписок в виде списков смежности."""
+
+    def __init__(self, edges):
+        self.following = defaultdict(set)
+        self.followers = defaultdict(set)
+        for user_id, author_id in edges:
+            self.following[user_id].add(author_id)
+            self.followers[author_id].add(user_id)
+        self._co_followed = {}
+
+    @classmethod
+    def load(cls):
+        return cls(
+            Follow.objects.values_list("user_id", "author_id").iterator()
+        )
+
+    @classmethod
+    def load_for(cls, users):
+        """Часть графа, по которой считаются рекомендации users.
+
+        Читаются подписки пользователей, подписки и читатели их авторов
+        и подписки этих читателей. Читатели авторов, у которых их больше
+        CO_FOLLOW_MAX_FANS, не читаются: совместные подписки для таких
+        авторов пропускаются и в полном графе.
+        """
+        users = set(users)
+        edges = list(follow_edges("user_id", users))
+        authors = {author for _, author in edges}
+        popular = set()
+        for batch in batches(sorted(authors), BATCH_SIZE):
+            popular.update(
+                Follow.objects.filter(author_id__in=batch)
+                .values("author_id").annotate(fans=Count("pk"))
+                .filter(fans__gt=CO_FOLLOW_MAX_FANS)
+                .values_list("author_id", flat=True)
+            )
+        edges += follow_edges("author_id", authors - popular)
+        readers = authors | {user for user, _ in edges}
+        edges += follow_edges("user_id", readers - users)
+        graph = cls(edges)
+        for author in popular:
+            graph._co_followed[author] = []
+        return graph
+
+    def co_followed(self, author_id):
+        """Авторы, которых читают вместе с author_id: пары (id, доля)."""
+        if author_id not in self._co_followed:
+            fans = self.followers.get(author_id, ())
+            result = []
+            if len(fans) <= CO_FOLLOW_MAX_FANS:
+                counts = Counter(chain.from_iterable(
+                    self.following[fan] for fan in fans
+                ))
+                del counts[author_id]
+                result = [
+                    (candidate, count / len(fans))
+                    for candidate, count in counts.most_common(CO_FOLLOW_TOP)
+                ]
+            self._co_followed[author_id] = result
+        return self._co_followed[author_id]
+
+    def scores(self, user_id):
+        """Очки кандидатов и число подписок пользователя на каждого."""
+        following = self.following.get(user_id, ())
+        mutual = Counter(chain.from_iterable(
+            self.following.get(friend, ()) for friend in following
+        ))
+        scores = defaultdict(float)
+        for candidate, count in mutual.items():
+            scores[candidate] = count * FRIEND_WEIGHT
+        for author in following:
+            for candidate, share in self.co_followed(author):
+                scores[candidate] += share * CO_FOLLOW_WEIGHT
+        return scores, mutual
+
+    def recommend(self, user_id, limit=RECOMMENDATIONS_LIMIT):
+        """Лучшие кандидаты пользователя: список (id, очки, общих)."""
+        scores, mutual = self.scores(user_id)
+        excluded = self.following.get(user_id, set()) | {user_id}
+        best = heapq.nlargest(
+            limit,
+            (
+                (score, -candidate)
+                for candidate, score in scores.items()
+                if candidate not in excluded
+            ),
+        )
+        return [
+            (-candidate, score, mutual.get(-candidate, 0))
+            for score, candidate in best
+        ]
+
+
+def follow_edges(field, ids):
+    """Подписки (кто, на кого), у которых field входит в ids."""
+    for batch in batches(sorted(ids), BATCH_SIZE):
+        yield from Follow.objects.filter(
+            **{f"{field}__in": batch}
+        ).values_list("user_id", "author_id")
+
+
+def store(graph, users, limit=RECOMMENDATIONS_LIMIT):
+    """Заменяет сохранённые рекомендации пользователей users."""
+    with transaction.atomic():
+        Recommendation.objects.filter(user_id__in=users).delete()
+        Recommendation.objects.bulk_create(
+            Recommendation(
+                user_id=user_id,
+                candidate_id=candidate_id,
+                score=score,
+                mutual_count=mutual_count,
+            )
+            for user_id in users
+            for candidate_id, score, mutual_count in graph.recommend(
+                user_id, limit
+            )
+        )
+        bump_versions([("user", user_id) for user_id in users])
+
+
+def refresh(limit=RECOMMENDATIONS_LIMIT, batch_size=BATCH_SIZE):
+    """Пересчитывает рекомендации всех пользователей графа.
+
+    Рекомендации пользователей без подписок удаляются. Возвращает
+    число пересчитанных пользователей.
+    """
+    graph = FollowGraph.load()
+    users = sorted(graph.following)
+    Recommendation.objects.exclude(
+        user_id__in=Follow.objects.values("user_id")
+    ).delete()
+    RecommendationQueue.objects.all().delete()
+    for start in range(0, len(users), batch_size):
+        store(graph, users[start:start + batch_size], limit)
+    bump_generation()
+    return len(users)
+
+
+def refresh_queued(limit=RECOMMENDATIONS_LIMIT, batch_size=BATCH_SIZE):
+    """Пересчитывает рекомендации пользователей из очереди.
+
+    Вместе с пользователем пересчитываются его подписчики: его подписки —
+    друзья друзей для них. Пользователи снимаются с очереди до пересчёта:
+    подписка, сделанная во время пересчёта, снова поставит их в очередь.
+    Возвращает число пересчитанных пользователей.
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            changed = list(RecommendationQueue.objects.order_by(
+                "user_id"
+            ).values_list("user_id", flat=True)[:batch_size])
+            RecommendationQueue.objects.filter(user_id__in=changed).delete()
+        if not changed:
+            if total:
+                bump_generation()
+            return total
+        users = set(changed)
+        users.update(
+            user for user, _ in follow_edges("author_id", changed)
+        )
+        for batch in batches(sorted(users), batch_size):
+            store(FollowGraph.load_for(batch), batch, limit)
+        total += len(users)
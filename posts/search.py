@@ -0,0 +1,215 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Таблица posts_search хранит текст поста, rowid строки совпадает с id
+поста. Каждый комментарий — отдельная строка posts_comment_search с id
+комментария и id его поста, поэтому новый комментарий добавляет в индекс
+одну строку, а не пересобирает текст всех комментариев поста. Пост
+находится, если слова запроса есть в его тексте или в одном из
+комментариев; оценки совпадений складываются. Строки обновляются
+сигналами, а команда rebuild_search_index заполняет таблицы заново.
+"""
+import math
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from posts.models import Post
+from posts.paginators import PAGE_SIZE, CursorPage, CursorPaginator
+
+# Совпадение в комментарии весит меньше, чем в тексте поста.
+COMMENT_WEIGHT = 0.3
+MATCHES_SQL = (
+    "SELECT rowid AS id, bm25(posts_search) AS score"
+    " FROM posts_search WHERE posts_search MATCH %s"
+    " UNION ALL"
+    f" SELECT post_id, {COMMENT_WEIGHT} * bm25(posts_comment_search)"
+    " FROM posts_comment_search WHERE posts_comment_search MATCH %s"
+)
+INDEX_SQL = (
+    "INSERT INTO posts_search (rowid, text) SELECT id, text FROM posts_post"
+)
+INDEX_COMMENTS_SQL = (
+    "INSERT INTO posts_comment_search (rowid, text, post_id) "
+    "SELECT id, text, post_id FROM posts_comment"
+)
+
+
+def index_post(post_id):
+    """Обновляет строку поиска с текстом поста post_id."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM posts_search WHERE rowid = %s", [post_id]
+        )
+        cursor.execute(f"{INDEX_SQL} WHERE id = %s", [post_id])
+
+
+def remove_post(post_id):
+    """Убирает текст поста post_id из поиска.
+
+    Комментарии поста удаляются каскадом и убираются своими сигналами.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM posts_search WHERE rowid = %s", [post_id]
+        )
+
+
+def index_comment(comment_id):
+    """Обновляет строку поиска комментария comment_id."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM posts_comment_search WHERE rowid = %s", [comment_id]
+        )
+        cursor.execute(f"{INDEX_COMMENTS_SQL} WHERE id = %s", [comment_id])
+
+
+def remove_comment(comment_id):
+    """Убирает комментарий comment_id из поиска."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM posts_comment_search WHERE rowid = %s", [comment_id]
+        )
+
+
+def rebuild_index():
+    """Заполняет таблицы поиска заново и возвращает число постов в них."""
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM posts_comment_search")
+        cursor.execute(INDEX_COMMENTS_SQL)
+        cursor.execute("DELETE FROM posts_search")
+        cursor.execute(INDEX_SQL)
+        return cursor.rowcount
+
+
+def to_match(query):
+    """Превращает пользовательский запрос в выражение MATCH.
+
+    Операторы FTS5 из запроса не пропускаются: каждое слово берётся
+    в кавычки, последнее ищется ещё и как начало слова.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def filter_posts(queryset, query):
+    """Оставляет в queryset посты, найденные по запросу query."""
+    match = to_match(query)
+    return queryset.filter(pk__in=RawSQL(
+        f"SELECT id FROM ({MATCHES_SQL})", [match, match]
+    ))
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсорная пагинация результатов поиска по (релевантность, id).
+
+    Курсор хранит оценку bm25 и id последнего поста страницы, поэтому
+    следующая страница не пересчитывает OFFSET по всем совпадениям.
+    """
+
+    def __init__(self, match, per_page=PAGE_SIZE):
+        super().__init__(None, per_page, ordering=("search_rank", "-id"))
+        self.match = match
+
+    def decode_cursor(self, cursor):
+        """Возвращает (оценка, id) из курсора или None, если он испорчен.
+
+        Значения уходят в сырой SQL, поэтому оценка должна быть конечным
+        числом, а id — целым.
+        """
+        values = self.load_cursor(cursor)
+        if values is None:
+            return None
+        score, pk = values
+        if (
+            isinstance(score, bool) or not isinstance(score, (int, float))
+            or not math.isfinite(score)
+            or isinstance(pk, bool) or not isinstance(pk, int)
+        ):
+            return None
+        return [float(score), pk]
+
+    def _fetch(self, values, forward, limit):
+        """Посты после курсора values (forward) или до него."""
+        sql = (
+            "SELECT id, score FROM ("
+            f" SELECT id, SUM(score) AS score FROM ({MATCHES_SQL})"
+            " GROUP BY id"
+            ")"
+        )
+        params = [self.match, self.match]
+        if values is not None:
+            sign = ">" if forward else "<"
+            reverse_sign = "<" if forward else ">"
+            sql += (
+                f" WHERE score {sign} %s"
+                f" OR (score = %s AND id {reverse_sign} %s)"
+            )
+            params += [values[0], values[0], values[1]]
+        sql += (
+            " ORDER BY score, id DESC" if forward
+            else " ORDER BY score DESC, id"
+        )
+        sql += " LIMIT %s"
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        posts = Post.objects.select_related("author", "group").in_bulk(
+            [pk for pk, _ in rows]
+        )
+        result = []
+        for pk, score in rows:
+            if pk in posts:
+                posts[pk].search_rank = score
+                result.append(posts[pk])
+        return result
+
+    def page(self, after=None, before=None):
+        """Возвращает страницу после курсора after или до курсора before."""
+        cursor = after or before
+        values = self.decode_cursor(cursor) if cursor else None
+        if values is None or not before:
+            rows = self._fetch(values, True, self.per_page + 1)
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            page = CursorPage(
+                rows,
+                next_cursor=self.encode_cursor(rows[-1]) if has_next else None,
+            )
+            if values is not None:
+                page.previous_cursor = (
+                    self.encode_cursor(rows[0]) if rows else after
+                )
+            return page
+
+        rows = self._fetch(values, False, self.per_page + 1)
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return CursorPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1]) if rows else before,
+            previous_cursor=(
+                self.encode_cursor(rows[0]) if has_previous else None
+            ),
+        )
+
+
+def search(request, query, per_page=PAGE_SIZE):
+    """Возвращает контекст со страницей результатов поиска query."""
+    match = to_match(query)
+    if not match:
+        return {"page": CursorPage([]), "paginator": None}
+    paginator = SearchPaginator(match, per_page)
+    return {
+        "page": paginator.page(
+            after=request.GET.get("after"),
+            before=request.GET.get("before"),
+        ),
+        "paginator": paginator,
+    }
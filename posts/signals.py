@@ -0,0 +1,251 @@
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (
+    post_delete, post_init, post_save, pre_delete
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from posts.cache import bump_generation, bump_versions
+from posts.models import (
+    ActivityBucket, Comment, FeedEntry, Follow, Group, Post, Recommendation,
+    RecommendationQueue, User, UserStats
+)
+from posts.search import (
+    index_comment, index_post, remove_comment, remove_post
+)
+from posts.thumbnails import schedule_thumbnails
+
+
+# id постов, которые сейчас удаляются. Комментарии поста удаляются
+# каскадом до него самого, а счётчик и версии страниц поста при этом
+# меняет удаление поста, поэтому обработчики комментариев их пропускают.
+# Вместе с отметками хранится список колбэков on_commit соединения, при
+# котором они поставлены.
+_deleting_posts = ContextVar("deleting_posts", default=(None, set()))
+
+
+def deleting_posts(using=DEFAULT_DB_ALIAS):
+    """Множество id постов, удаляемых в текущей транзакции.
+
+    Django заменяет список колбэков on_commit соединения при фиксации и
+    при любом откате, в том числе до точки сохранения. Отметки, список
+    которых уже заменён, сбрасываются: отметка неудавшегося удаления не
+    переживает его транзакцию.
+    """
+    hooks = transaction.get_connection(using).run_on_commit
+    owner, posts = _deleting_posts.get()
+    if owner is not hooks:
+        posts = set()
+        _deleting_posts.set((hooks, posts))
+    return posts
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    """Создаёт пустые счётчики для нового пользователя."""
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    """Увеличивает счётчик записей автора, раскладывает пост по лентам и
+    учитывает его в активности сообщества."""
+    if created and not raw:
+        UserStats.change(instance.author_id, posts_count=1)
+        FeedEntry.fan_out(instance)
+        ActivityBucket.record(
+            ActivityBucket.GROUP, instance.group_id, instance.pub_date
+        )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, raw=False, **kwargs):
+    """Ставит в очередь создание миниатюр изображения поста."""
+    if not raw:
+        schedule_thumbnails(instance.image)
+
+
+@receiver(post_save, sender=Post)
+def post_indexed(sender, instance, raw=False, **kwargs):
+    """Обновляет текст поста в поисковом индексе."""
+    if not raw:
+        index_post(instance.pk)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, using, **kwargs):
+    """Отмечает пост, комментарии которого удаляются вместе с ним."""
+    deleting_posts(using).add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, using, **kwargs):
+    """Уменьшает счётчик записей автора и убирает пост из поиска."""
+    deleting_posts(using).discard(instance.pk)
+    UserStats.change(instance.author_id, posts_count=-1)
+    remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    """Увеличивает счётчики подписок, заполняет ленту подписчика,
+    учитывает подписку в активности автора и убирает автора из
+    рекомендаций подписчика."""
+    if created and not raw:
+        UserStats.change(instance.user_id, following_count=1)
+        UserStats.change(instance.author_id, followers_count=1)
+        FeedEntry.backfill(instance.user_id, instance.author_id)
+        ActivityBucket.record(ActivityBucket.AUTHOR, instance.author_id)
+        Recommendation.objects.filter(
+            user_id=instance.user_id, candidate_id=instance.author_id
+        ).delete()
+        RecommendationQueue.mark_stale(instance.user_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """Уменьшает счётчики подписок и убирает автора из ленты подписчика."""
+    UserStats.change(instance.user_id, following_count=-1)
+    UserStats.change(instance.author_id, followers_count=-1)
+    FeedEntry.prune(instance.user_id, instance.author_id)
+    RecommendationQueue.mark_stale(instance.user_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    """Увеличивает счётчик комментариев поста и учитывает комментарий в
+    активности поста и его сообщества."""
+    if created and not raw:
+        # Автора и сообщество поста берёт и page_scopes для версий страниц.
+        instance._post_owners = Post.count_comment(instance.post_id)
+        _, group_id = instance._post_owners
+        ActivityBucket.record(
+            ActivityBucket.POST, instance.post_id, instance.created
+        )
+        ActivityBucket.record(
+            ActivityBucket.GROUP, group_id, instance.created
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, using, **kwargs):
+    """Уменьшает счётчик комментариев поста."""
+    if instance.post_id not in deleting_posts(using):
+        # Разошедшийся после массовой загрузки счётчик не уходит ниже нуля.
+        Post.objects.filter(pk=instance.post_id).update(
+            comments_count=Greatest(F("comments_count") - 1, 0)
+        )
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, raw=False, **kwargs):
+    """Обновляет текст комментария в поисковом индексе."""
+    if not raw:
+        index_comment(instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_removed(sender, instance, **kwargs):
+    """Убирает текст удалённого комментария из поискового индекса."""
+    remove_comment(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    """Обновляет версию карточек постов переименованного сообщества."""
+    if not created and not raw:
+        Post.objects.filter(group=instance).update(updated=timezone.now())
+
+
+def invalidate_pages(sender, **kwargs):
+    """Сбрасывает кэш страниц при любом изменении отображаемых данных."""
+    bump_generation()
+
+
+for model in (Post, Comment, Group, Follow):
+    post_save.connect(invalidate_pages, sender=model)
+    post_delete.connect(invalidate_pages, sender=model)
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    """Запоминает сообщество поста, чтобы сменить версию и прежнего."""
+    instance._loaded_group_id = instance.__dict__.get("group_id")
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    """Запоминает имя пользователя, чтобы заметить переименование."""
+    instance._loaded_username = instance.__dict__.get("username")
+
+
+@receiver(post_save, sender=User)
+def user_renamed(sender, instance, created, raw=False, **kwargs):
+    """Сбрасывает страницы с карточками постов переименованного автора.
+
+    Имя автора видно в карточках на главной и в сообществах, а сохранение
+    пользователя поколение кэша страниц не меняет.
+    """
+    if created or raw:
+        return
+    if instance.username != getattr(instance, "_loaded_username", None):
+        groups = Post.objects.filter(author=instance).exclude(
+            group=None
+        ).values_list("group_id", flat=True).distinct()
+        bump_versions(("group", group) for group in groups)
+        bump_generation()
+    instance._loaded_username = instance.username
+
+
+def page_scopes(instance):
+    """Пары (вид, id) страниц, которые показывают instance."""
+    if isinstance(instance, Post):
+        return [
+            ("post", instance.pk),
+            ("user", instance.author_id),
+            ("group", instance.group_id),
+            ("group", getattr(instance, "_loaded_group_id", None)),
+        ]
+    if isinstance(instance, Comment):
+        if instance.post_id in deleting_posts():
+            # Версии тех же страниц меняет удаление самого поста.
+            return []
+        # Число комментариев видно и на карточках в профиле и сообществе.
+        owners = getattr(instance, "_post_owners", None)
+        if owners is None:
+            owners = instance.post.author_id, instance.post.group_id
+        author_id, group_id = owners
+        return [
+            ("post", instance.post_id),
+            ("user", author_id),
+            ("group", group_id),
+        ]
+    if isinstance(instance, Follow):
+        return [("user", instance.user_id), ("user", instance.author_id)]
+    if isinstance(instance, Group):
+        authors = Post.objects.filter(group=instance).values_list(
+            "author_id", flat=True
+        ).distinct()
+        return [("group", instance.pk)] + [
+            ("user", author) for author in authors
+        ]
+    return [("user", instance.pk)]
+
+
+def invalidate_versions(sender, instance, raw=False, **kwargs):
+    """Меняет версии страниц, на которых виден изменённый объект."""
+    if not raw:
+        bump_versions(page_scopes(instance))
+
+
+for model in (Post, Comment, Group, Follow, User):
+    post_save.connect(invalidate_versions, sender=model)
+    post_delete.connect(invalidate_versions, sender=model)
+# Посты удаляемого сообщества теряют его до post_delete, поэтому версии
+# страниц их авторов меняются заранее.
+pre_delete.connect(invalidate_versions, sender=Group)
@@ -0,0 +1,33 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.cache import POST_CARD_TEMPLATE, POST_CARD_TIMEOUT, post_card_key
+from posts.thumbnails import prefetch_variants
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """Выводит карточки постов, беря готовый HTML из кэша одним запросом."""
+    request = context.get("request")
+    user_id = request.user.pk if request is not None else None
+    cards = {
+        post_card_key(post, post.author_id == user_id): post
+        for post in posts
+    }
+    rendered = cache.get_many(cards)
+    prefetch_variants(
+        post.image for key, post in cards.items() if key not in rendered
+    )
+    missing = {}
+    for key, post in cards.items():
+        if key not in rendered:
+            rendered[key] = missing[key] = render_to_string(
+                POST_CARD_TEMPLATE, {"post": post, "request": request}
+            )
+    if missing:
+        cache.set_many(missing, POST_CARD_TIMEOUT)
+    return mark_safe("".join(rendered[key] for key in cards))
@@ -0,0 +1,11 @@
+from django import template
+
+from posts.thumbnails import image_variants
+
+register = template.Library()
+
+
+@register.inclusion_tag("incudes/post_image.html")
+def post_image(image):
+    """Выводит изображение поста с вариантами WebP и JPEG разной ширины."""
+    return {"image": image_variants(image)}
@@ -0,0 +1,19 @@
+from django import template
+
+from posts.models import Recommendation
+
+register = template.Library()
+
+RECOMMENDATIONS_SHOWN = 5
+
+
+@register.inclusion_tag("incudes/recommendations.html")
+def who_to_follow(user, limit=RECOMMENDATIONS_SHOWN):
+    """Выводит готовые рекомендации пользователя одним запросом."""
+    if not user.is_authenticated:
+        return {"recommendations": ()}
+    return {
+        "recommendations": Recommendation.objects.filter(
+            user=user
+        ).select_related("candidate")[:limit]
+    }
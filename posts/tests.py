@@ -1,15 +1,52 @@
+import base64
+import csv
+import gzip
+import importlib
 import io
+import json
+import multiprocessing
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from datetime import timedelta
 from unittest import mock
 from urllib.parse import urljoin
 
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
 from django.core.cache import cache
 from django.core.files.base import ContentFile, File
-from django.test import Client, TestCase
+from django.core.management import CommandError, call_command
+from django.db import (
+    DatabaseError, connection, connections, router, transaction
+)
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.test import (
+    Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from PIL import Image
-from posts.models import Comment, Follow, Group, Post
+from posts.admin import PostAdmin
+from posts.cache import bump_generation, cache_page_versioned
+from posts.models import (
+    ActivityBucket, Comment, FeedEntry, Follow, Group, Post, Recommendation,
+    RecommendationQueue, TrendingGroup, TrendingPost, UserStats
+)
+from posts.paginators import COMMENT_ORDERING, CursorPaginator
+from posts.recommendations import FollowGraph
+from posts.thumbnails import generate_thumbnails, image_variants
+from yatube.cache import SQLiteCache
+from yatube.middleware import QueryBudgetExceeded
+from yatube.routers import STICKY_COOKIE, ReplicaRoutingMiddleware
+from yatube.throttling import THROTTLE_COOKIE, take_token
 
 
 class TestUser(TestCase):
@@ -276,7 +313,8 @@ class TestUser(TestCase):
 
     def test_cache(self):
         cache.clear()
-        with self.assertNumQueries(3):
+        # Страница из кэша читает из базы только поколение.
+        with self.assertNumQueries(5):
             response = self.auth_client.get(reverse("index"))
             self.assertEqual(response.status_code, 200)
             response = self.auth_client.get(reverse("index"))
@@ -287,7 +325,31 @@ class TestUser(TestCase):
                 data={"text": self.text_first, "group": self.group.id}
         )
         response = self.auth_client.get(reverse("index"))
-        self.assertNotContains(response, self.text_first)
+        self.assertContains(response, self.text_first)
+        with self.assertNumQueries(1):
+            response = self.auth_client.get(reverse("index"))
+        self.assertContains(response, self.text_first)
+
+    def test_cache_invalidated_by_comment(self):
+        post = Post.objects.create(text=self.text_first, author=self.user)
+        url = reverse("profile", kwargs={"username": self.user})
+        cache.clear()
+        self.assertContains(self.auth_client.get(url), "Добавить комментарий")
+        Comment.objects.create(post=post, author=self.user, text="text")
+        self.assertContains(self.auth_client.get(url), "1 комментариев")
+
+    def test_cached_pages_vary_by_user(self):
+        other = User.objects.create_user("other", "other@test.com", "12345")
+        other_client = Client()
+        other_client.force_login(other)
+        cache.clear()
+        for url in (reverse("index"), reverse("follow_index")):
+            self.assertContains(
+                self.auth_client.get(url), f"Пользователь: {self.user}"
+            )
+            response = other_client.get(url)
+            self.assertContains(response, "Пользователь: other")
+            self.assertNotContains(response, f"Пользователь: {self.user}")
 
     def follow_to_author(self):
         self.author = User.objects.create_user(
@@ -337,3 +399,1707 @@ class TestUser(TestCase):
         self.assertEqual(len(response.context["paginator"].object_list), 1)
         self.assertEqual(current_post.author, author)
         self.assertEqual(current_post.text, post.text)
+
+
+class TestUserStats(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user("user1", "user1@test.com", "12345")
+        self.author = User.objects.create_user(
+            "user2", "user2@test.com", "12345"
+        )
+        self.client.force_login(self.user)
+
+    def test_counters_follow_writes(self):
+        post = Post.objects.create(text="text", author=self.author)
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(UserStats.objects.get(user=self.author).posts_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 1
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 1
+        )
+
+        post.delete()
+        follow.delete()
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 0)
+        self.assertEqual(stats.followers_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 0
+        )
+
+    def test_drifted_counters_stop_at_zero(self):
+        post = Post.objects.create(text="text", author=self.author)
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        UserStats.objects.update(
+            posts_count=0, followers_count=0, following_count=0
+        )
+        post.delete()
+        follow.delete()
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 0)
+        self.assertEqual(stats.followers_count, 0)
+
+    def test_reconcile_counters(self):
+        post = Post.objects.create(text="text", author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        UserStats.objects.update(
+            posts_count=7, followers_count=7, following_count=7
+        )
+        Post.objects.update(comments_count=3)
+        UserStats.objects.filter(user=self.user).delete()
+
+        call_command("reconcile_counters", stdout=io.StringIO())
+
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(stats.following_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).following_count, 1
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_profile_uses_stats(self):
+        Post.objects.create(text="text", author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.client.get(
+            reverse("profile", kwargs={"username": self.author.username})
+        )
+        self.assertEqual(response.context["post_count"], 1)
+        self.assertEqual(response.context["following"], 1)
+        self.assertEqual(response.context["follower"], 0)
+
+
+class TestCursorPagination(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user("user1", "user1@test.com", "12345")
+        Post.objects.bulk_create(
+            Post(text=f"post {number}", author=self.user)
+            for number in range(65)
+        )
+        cache.clear()
+
+    def walk(self, url):
+        """Проходит ленту от первой до последней страницы."""
+        texts = []
+        response = self.client.get(url)
+        while True:
+            page = response.context["page"]
+            texts.extend(post.text for post in page)
+            if not page.has_next() or getattr(page, "is_cursor", False):
+                if not page.next_cursor:
+                    return texts, page
+                next_url = f"{url}?after={page.next_cursor}"
+            else:
+                next_url = f"{url}?page={page.next_page_number()}"
+            response = self.client.get(next_url)
+
+    def test_walk_numbered_then_cursor(self):
+        url = reverse("profile", kwargs={"username": self.user.username})
+        texts, last_page = self.walk(url)
+        expected = [
+            post.text for post in Post.objects.order_by("-pub_date", "-id")
+        ]
+        self.assertEqual(texts, expected)
+        self.assertTrue(last_page.is_cursor)
+        self.assertEqual(len(last_page), 5)
+
+        response = self.client.get(
+            f"{url}?before={last_page.previous_cursor}"
+        )
+        self.assertEqual(
+            [post.text for post in response.context["page"]],
+            expected[50:60],
+        )
+
+    def test_numbered_pages_are_limited(self):
+        response = self.client.get(reverse("index"), {"page": 100})
+        self.assertEqual(response.context["paginator"].num_pages, 5)
+        self.assertIsNotNone(response.context["page"].next_cursor)
+
+    def test_full_window_has_no_cursor(self):
+        author = User.objects.create_user("user2", "u2@test.com", "12345")
+        Post.objects.bulk_create(
+            Post(text=f"other {number}", author=author)
+            for number in range(50)
+        )
+        response = self.client.get(
+            reverse("profile", kwargs={"username": author.username}),
+            {"page": 5},
+        )
+        page = response.context["page"]
+        self.assertEqual(len(page), 10)
+        self.assertFalse(page.has_next())
+        self.assertIsNone(page.next_cursor)
+        self.assertNotContains(response, "after=")
+
+    def test_broken_cursor_returns_first_page(self):
+        response = self.client.get(reverse("index"), {"after": "broken"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["page"]), 10)
+
+    def test_mistyped_cursor_returns_first_page(self):
+        reader = User.objects.create_user("reader", "r@test.com", "12345")
+        Follow.objects.create(user=reader, author=self.user)
+        self.client.force_login(reader)
+        for values in (
+            ["x", 1], [{"a": 1}, 1], [None, None],
+            ["2020-01-01T00:00:00", "zz"],
+        ):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps(values).encode()
+            ).decode()
+            for name in ("index", "follow_index"):
+                for param in ("after", "before"):
+                    response = self.client.get(
+                        reverse(name), {param: cursor}
+                    )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.context["page"]), 10)
+
+
+class TestFeed(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user("user1", "user1@test.com", "12345")
+        self.author = User.objects.create_user(
+            "user2", "user2@test.com", "12345"
+        )
+        self.client.force_login(self.user)
+
+    def feed(self):
+        response = self.client.get(reverse("follow_index"))
+        return [post.text for post in response.context["page"]]
+
+    def test_follow_backfills_and_new_posts_fan_out(self):
+        Post.objects.create(text="old", author=self.author)
+        self.client.get(
+            reverse("profile_follow", kwargs={"username": self.author})
+        )
+        self.client.force_login(self.author)
+        self.client.post(reverse("post_new"), data={"text": "new"})
+        self.client.force_login(self.user)
+
+        self.assertEqual(self.feed(), ["new", "old"])
+        self.assertEqual(FeedEntry.objects.filter(user=self.user).count(), 2)
+
+    def test_unfollow_prunes_feed(self):
+        Post.objects.create(text="old", author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        self.client.get(
+            reverse("profile_unfollow", kwargs={"username": self.author})
+        )
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def test_rebuild_feeds(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.bulk_create([Post(text="bulk", author=self.author)])
+        call_command("rebuild_feeds", stdout=io.StringIO())
+        self.assertEqual(self.feed(), ["bulk"])
+
+
+class TestListQueries(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user("user1", "user1@test.com", "12345")
+        self.author = User.objects.create_user(
+            "user2", "user2@test.com", "12345"
+        )
+        self.group = Group.objects.create(
+            title="test_group", slug="test_group", description="test_group"
+        )
+        Follow.objects.create(user=self.user, author=self.author)
+        self.client.force_login(self.user)
+        self.urls = (
+            reverse("index"),
+            reverse("group_post", kwargs={"slug": self.group.slug}),
+            reverse("profile", kwargs={"username": self.author.username}),
+            reverse("follow_index"),
+        )
+
+    def add_posts(self, count):
+        for number in range(count):
+            post = Post.objects.create(
+                text=f"post {number}", author=self.author, group=self.group
+            )
+            Comment.objects.create(post=post, author=self.user, text="text")
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_comments_count_follows_writes(self):
+        self.add_posts(1)
+        post = Post.objects.get()
+        self.assertEqual(post.comments_count, 1)
+        post.comments.get().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_drifted_comments_count_stops_at_zero(self):
+        self.add_posts(1)
+        post = Post.objects.get()
+        Post.objects.update(comments_count=0)
+        post.comments.get().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_edit_keeps_comments_count(self):
+        self.add_posts(1)
+        post = Post.objects.get()
+        self.client.force_login(self.author)
+
+        def load_then_comment(*args, **kwargs):
+            loaded = get_object_or_404(*args, **kwargs)
+            Comment.objects.create(post=post, author=self.user, text="new")
+            return loaded
+
+        with mock.patch(
+            "posts.views.get_object_or_404", side_effect=load_then_comment
+        ):
+            self.client.post(
+                reverse("post_edit", args=[self.author, post.id]),
+                {"text": "edited", "group": self.group.id},
+            )
+        post.refresh_from_db()
+        self.assertEqual(post.text, "edited")
+        self.assertEqual(post.comments_count, 2)
+
+    def test_admin_edit_keeps_comments_count(self):
+        self.add_posts(1)
+        post = Post.objects.get()
+        admin = User.objects.create_superuser("admin", "a@test.com", "12345")
+        self.client.force_login(admin)
+        get_object = PostAdmin.get_object
+
+        def load_then_comment(*args, **kwargs):
+            loaded = get_object(*args, **kwargs)
+            Comment.objects.create(post=post, author=self.user, text="new")
+            return loaded
+
+        with mock.patch.object(
+            PostAdmin, "get_object", side_effect=load_then_comment,
+            autospec=True,
+        ):
+            response = self.client.post(
+                reverse("admin:posts_post_change", args=[post.id]),
+                {
+                    "text": "edited",
+                    "author": self.author.id,
+                    "group": self.group.id,
+                },
+            )
+        self.assertEqual(response.status_code, 302)
+        post.refresh_from_db()
+        self.assertEqual(post.text, "edited")
+        self.assertEqual(post.comments_count, 2)
+
+    def test_queries_do_not_grow_with_page_size(self):
+        self.add_posts(1)
+        small = [self.count_queries(url) for url in self.urls]
+        self.add_posts(9)
+        large = [self.count_queries(url) for url in self.urls]
+        self.assertEqual(small, large)
+        response = self.client.get(self.urls[0])
+        self.assertContains(response, "1 комментариев", count=10)
+
+
+class TestPostCardCache(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user("user1", "user1@test.com", "12345")
+        self.author = User.objects.create_user(
+            "user2", "user2@test.com", "12345"
+        )
+        self.group = Group.objects.create(
+            title="test_group", slug="test_group", description="test_group"
+        )
+        self.post = Post.objects.create(
+            text="cached text", author=self.author, group=self.group
+        )
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def test_card_shared_between_pages(self):
+        self.client.get(reverse("index"))
+        with mock.patch(
+            "posts.templatetags.post_cards.render_to_string"
+        ) as render:
+            bump_generation()
+            response = self.client.get(
+                reverse("group_post", kwargs={"slug": self.group.slug})
+            )
+        render.assert_not_called()
+        self.assertContains(response, "cached text")
+
+    def test_card_refreshed_after_edit(self):
+        self.client.get(reverse("index"))
+        self.post.text = "edited text"
+        self.post.save()
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "edited text")
+
+    def test_card_refreshed_after_author_rename(self):
+        self.client.get(reverse("index"))
+        self.author.username = "renamed"
+        self.author.save()
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "@renamed")
+        self.assertContains(response, reverse("profile", args=["renamed"]))
+
+    def test_card_refreshed_after_group_delete(self):
+        url = reverse("profile", kwargs={"username": self.author.username})
+        etag = self.client.get(url)["ETag"]
+        self.group.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "test_group")
+
+    def test_owner_gets_edit_link(self):
+        url = reverse("index")
+        edit_url = reverse(
+            "post_edit",
+            kwargs={"username": self.author.username, "post_id": self.post.id}
+        )
+        self.assertNotContains(self.client.get(url), edit_url)
+        self.client.force_login(self.author)
+        self.assertContains(self.client.get(url), edit_url)
+
+
+def incr_shared_counter(path):
+    from yatube.cache import SQLiteCache
+    cache_backend = SQLiteCache(path, {})
+    for _ in range(50):
+        cache_backend.incr("counter")
+
+
+class TestSQLiteCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = f"{self.directory.name}/cache.sqlite3"
+        self.cache = SQLiteCache(
+            self.path, {"OPTIONS": {"MAX_ENTRIES": 3, "CULL_EVERY": 1}}
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_set_add_delete(self):
+        self.cache.set("key", {"value": 1})
+        self.assertEqual(self.cache.get("key"), {"value": 1})
+        self.assertFalse(self.cache.add("key", "other"))
+        self.assertTrue(self.cache.add("new", "value"))
+        self.assertEqual(
+            self.cache.get_many(["key", "new", "missing"]),
+            {"key": {"value": 1}, "new": "value"},
+        )
+        self.cache.delete("key")
+        self.assertIsNone(self.cache.get("key"))
+
+    def test_expired_entries_are_missing(self):
+        self.cache.set("key", "value", timeout=-1)
+        self.assertIsNone(self.cache.get("key"))
+        self.assertTrue(self.cache.add("key", "value"))
+
+    def test_least_recently_used_is_evicted(self):
+        with mock.patch("yatube.cache.time.time", side_effect=range(100, 200)):
+            for key in ("a", "b", "c"):
+                self.cache.set(key, key, timeout=None)
+            self.cache.get("a")
+            self.cache.set("d", "d", timeout=None)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), "a")
+
+    def test_entries_are_counted_every_cull_every_writes(self):
+        cache = SQLiteCache(
+            self.path, {"OPTIONS": {"MAX_ENTRIES": 3, "CULL_EVERY": 5}}
+        )
+        for key in "abcd":
+            cache.set(key, key, timeout=None)
+        self.assertEqual(len(cache.get_many(list("abcd"))), 4)
+        cache.set("e", "e", timeout=None)
+        self.assertEqual(len(cache.get_many(list("abcde"))), 3)
+
+    def test_incr_is_shared_between_processes(self):
+        self.cache.set("counter", 0)
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=incr_shared_counter, args=(self.path,))
+            for _ in range(3)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get("counter"), 150)
+        with self.assertRaises(ValueError):
+            self.cache.incr("missing")
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TestThumbnails(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user1", "user1@test.com", "12345")
+        buffer = io.BytesIO()
+        Image.new("RGB", (1200, 800), (0, 0, 0)).save(buffer, format="jpeg")
+        self.post = Post.objects.create(
+            text="text",
+            author=self.user,
+            image=ContentFile(buffer.getvalue(), name="thumb.jpg"),
+        )
+        cache.clear()
+
+    def test_lookup_never_renders_in_request(self):
+        with mock.patch("posts.thumbnails._executor") as executor:
+            variants = image_variants(self.post.image)
+        self.assertEqual(variants, {"src": self.post.image.url})
+        executor.submit.assert_called_once_with(
+            generate_thumbnails, self.post.image.name
+        )
+
+        generate_thumbnails(self.post.image.name)
+        with mock.patch("posts.thumbnails._executor") as executor:
+            variants = image_variants(self.post.image)
+        self.assertTrue(
+            variants["src"].startswith(f"{settings.MEDIA_URL}cache/")
+        )
+        executor.submit.assert_not_called()
+
+    def test_missing_variants_submitted_once(self):
+        with mock.patch("posts.thumbnails._executor") as executor:
+            for _ in range(3):
+                image_variants(self.post.image)
+        executor.submit.assert_called_once_with(
+            generate_thumbnails, self.post.image.name
+        )
+
+        with mock.patch("posts.thumbnails.get_thumbnail"):
+            generate_thumbnails(self.post.image.name)
+        with mock.patch("posts.thumbnails._executor") as executor:
+            image_variants(self.post.image)
+        executor.submit.assert_called_once()
+
+    def test_etags_change_when_thumbnails_ready(self):
+        urls = [
+            reverse("post_view", args=["user1", self.post.pk]),
+            reverse("profile", args=["user1"]),
+        ]
+        with mock.patch("posts.thumbnails._executor"):
+            etags = [self.client.get(url)["ETag"] for url in urls]
+        generate_thumbnails(self.post.image.name)
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, '<source type="image/webp"')
+
+    def test_variants_in_srcset(self):
+        generate_thumbnails(self.post.image.name)
+        variants = image_variants(self.post.image)
+        for image_format, extension in (("webp", ".webp"), ("jpeg", ".jpg")):
+            candidates = variants[image_format].split(", ")
+            self.assertEqual(
+                [candidate.split()[1] for candidate in candidates],
+                ["320w", "640w", "960w"],
+            )
+            for candidate in candidates:
+                self.assertTrue(candidate.split()[0].endswith(extension))
+        self.assertTrue(variants["src"].endswith(".jpg"))
+
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, f'srcset="{variants["jpeg"]}"')
+
+    def test_variants_read_in_one_query(self):
+        generate_thumbnails(self.post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            image_variants(self.post.image)
+        lookups = [
+            query for query in queries.captured_queries
+            if "thumbnail_kvstore" in query["sql"]
+        ]
+        self.assertEqual(len(lookups), 1)
+
+    def test_card_thumbnails_fetched_in_one_query(self):
+        names = [self.post.image.name]
+        for number in range(3):
+            buffer = io.BytesIO()
+            Image.new("RGB", (1200, 800)).save(buffer, format="jpeg")
+            post = Post.objects.create(
+                text="text",
+                author=self.user,
+                image=ContentFile(buffer.getvalue(), name=f"thumb{number}.jpg"),
+            )
+            names.append(post.image.name)
+        for name in names:
+            generate_thumbnails(name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("index"))
+        lookups = [
+            query for query in queries.captured_queries
+            if "thumbnail_kvstore" in query["sql"]
+        ]
+        self.assertEqual(len(lookups), 1)
+
+    def test_save_schedules_generation(self):
+        with mock.patch("posts.thumbnails._executor") as executor, \
+                mock.patch(
+                    "posts.thumbnails.transaction.on_commit",
+                    side_effect=lambda callback: callback()
+                ):
+            self.post.save()
+        executor.submit.assert_called_once_with(
+            generate_thumbnails, self.post.image.name
+        )
+
+
+class TestSearch(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user("user1", "user1@test.com", "12345")
+        cache.clear()
+
+    def search(self, query, **params):
+        response = self.client.get(reverse("search"), {"q": query, **params})
+        return response.context["page"]
+
+    def test_signals_keep_index_in_sync(self):
+        post = Post.objects.create(text="Рыжий кот на крыше", author=self.user)
+        self.assertEqual(list(self.search("кот")), [post])
+
+        post.text = "Серая собака во дворе"
+        post.save()
+        self.assertEqual(list(self.search("кот")), [])
+        self.assertEqual(list(self.search("собака")), [post])
+
+        comment = Comment.objects.create(
+            post=post, author=self.user, text="А где же кот?"
+        )
+        self.assertEqual(list(self.search("кот")), [post])
+        comment.delete()
+        self.assertEqual(list(self.search("кот")), [])
+
+        post.delete()
+        self.assertEqual(list(self.search("собака")), [])
+
+    def test_comment_indexed_as_own_row(self):
+        post = Post.objects.create(text="Про погоду", author=self.user)
+        for number in range(5):
+            Comment.objects.create(
+                post=post, author=self.user, text=f"ответ {number}"
+            )
+        with CaptureQueriesContext(connection) as queries:
+            comment = Comment.objects.create(
+                post=post, author=self.user, text="Рыжий кот"
+            )
+        indexing = [
+            query["sql"] for query in queries.captured_queries
+            if "_search" in query["sql"]
+        ]
+        self.assertEqual(len(indexing), 2)
+        self.assertTrue(all(str(comment.pk) in sql for sql in indexing))
+        self.assertEqual(list(self.search("кот")), [post])
+
+        post.delete()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM posts_comment_search")
+            self.assertEqual(cursor.fetchone(), (0,))
+
+    def test_text_ranks_above_comments(self):
+        commented = Post.objects.create(text="Про погоду", author=self.user)
+        Comment.objects.create(
+            post=commented, author=self.user, text="Отличный кот"
+        )
+        about = Post.objects.create(text="Кот и кот", author=self.user)
+        self.assertEqual(list(self.search("кот")), [about, commented])
+
+    def test_query_operators_are_escaped(self):
+        Post.objects.create(text="text", author=self.user)
+        for query in ('"', "AND OR", "text*)(", "-", "NEAR(text"):
+            response = self.client.get(reverse("search"), {"q": query})
+            self.assertEqual(response.status_code, 200)
+
+    def test_cursor_walk(self):
+        Post.objects.bulk_create(
+            Post(text=f"match {number}", author=self.user)
+            for number in range(25)
+        )
+        call_command("rebuild_search_index", stdout=io.StringIO())
+        url = reverse("search")
+        response = self.client.get(url, {"q": "match"})
+        ids, pages = [], []
+        while True:
+            page = response.context["page"]
+            pages.append(page)
+            ids.extend(post.id for post in page)
+            if not page.has_next():
+                break
+            self.assertContains(response, "q=match&amp;after=")
+            response = self.client.get(
+                url, {"q": "match", "after": page.next_cursor}
+            )
+        self.assertEqual(sorted(ids), sorted(
+            Post.objects.values_list("id", flat=True)
+        ))
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+
+        page = self.search("match", before=pages[-1].previous_cursor)
+        self.assertEqual(list(page), list(pages[1]))
+
+    def test_broken_cursor_starts_from_first_page(self):
+        post = Post.objects.create(text="match", author=self.user)
+        for values in (
+            [{"a": 1}, "y"], ["x", 1], [1.5, "zz"], [None, None],
+            [True, 1], [1e999, 1],
+        ):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps(values).encode()
+            ).decode()
+            for param in ("after", "before"):
+                response = self.client.get(
+                    reverse("search"), {"q": "match", param: cursor}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(list(response.context["page"]), [post])
+
+    def test_admin_uses_index(self):
+        post = Post.objects.create(text="Рыжий кот", author=self.user)
+        Post.objects.create(text="Серая собака", author=self.user)
+        admin = User.objects.create_superuser(
+            "admin", "admin@test.com", "12345"
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse("admin:posts_post_changelist"), {"q": "кот"}
+        )
+        self.assertEqual(list(response.context["cl"].result_list), [post])
+
+
+class TestQueryPlans(TestCase):
+    """Планы запросов страниц лент не должны сканировать таблицы целиком
+    или сортировать строки во временном B-дереве.
+
+    Поиск проверяется отдельно: FTS5 сортирует совпадения по bm25 всегда.
+    """
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user("user1", "user1@test.com", "12345")
+        self.author = User.objects.create_user(
+            "user2", "user2@test.com", "12345"
+        )
+        self.group = Group.objects.create(title="group", slug="group")
+        Follow.objects.create(user=self.user, author=self.author)
+        for number in range(60):
+            self.post = Post.objects.create(
+                text=f"post {number}", author=self.author, group=self.group
+            )
+        Comment.objects.create(post=self.post, author=self.user, text="text")
+        self.client.force_login(self.user)
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assert_indexed(self, url, **params):
+        """Проверяет планы всех запросов страницы и возвращает её."""
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        for query in queries.captured_queries:
+            if not query["sql"].startswith("SELECT"):
+                continue
+            for step in self.plan(query["sql"]):
+                with self.subTest(url=url, sql=query["sql"], step=step):
+                    self.assertNotIn("USE TEMP B-TREE", step)
+                    scan = re.fullmatch(r"SCAN (\S+)", step)
+                    if scan:
+                        self.assertIn("subquery", scan.group(1))
+        return response
+
+    def test_feed_pages(self):
+        for url in (
+                reverse("index"),
+                reverse("group_post", kwargs={"slug": self.group.slug}),
+                reverse("profile", kwargs={"username": self.author}),
+                reverse("follow_index"),
+        ):
+            response = self.assert_indexed(url, page=5)
+            page = response.context["page"]
+            self.assertIsNotNone(page.next_cursor)
+            response = self.assert_indexed(url, after=page.next_cursor)
+            self.assert_indexed(
+                url, before=response.context["page"].previous_cursor
+            )
+
+    def test_post_page(self):
+        self.assert_indexed(reverse(
+            "post_view",
+            kwargs={"username": self.author, "post_id": self.post.id},
+        ))
+
+    def test_comments_fragment(self):
+        comment = self.post.comments.get()
+        cursor = CursorPaginator(
+            self.post.comments.all(), ordering=COMMENT_ORDERING
+        ).encode_cursor(comment)
+        self.assert_indexed(
+            reverse("post_comments", args=[self.author, self.post.id]),
+            after=cursor,
+        )
+
+    def test_trending_pages(self):
+        call_command("rollup_trending", stdout=io.StringIO())
+        response = self.assert_indexed(reverse("trending"))
+        self.assertEqual(response.context["posts"][0], self.post)
+        response = self.assert_indexed(
+            reverse("group_post", kwargs={"slug": self.group.slug})
+        )
+        self.assertEqual(response.context["trending"][0], self.post)
+
+
+class TestQueryBudget(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user("user1", "user1@test.com", "12345")
+        self.post = Post.objects.create(text="text", author=self.user)
+        cache.clear()
+
+    @override_settings(QUERY_TIMING_HEADER=True)
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("index"))
+        self.assertRegex(
+            response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ SQL"$'
+        )
+
+    @override_settings(QUERY_TIMING_HEADER=False)
+    def test_server_timing_header_can_be_disabled(self):
+        response = self.client.get(reverse("index"))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    def test_post_view_within_budget(self):
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f"comment {number}")
+            for number in range(20)
+        )
+        response = self.client.get(reverse(
+            "post_view",
+            kwargs={"username": self.user.username, "post_id": self.post.id},
+        ))
+        self.assertEqual(response.status_code, 200)
+
+    def test_strict_mode_enabled_in_tests(self):
+        self.assertTrue(settings.QUERY_BUDGET_STRICT)
+
+    @override_settings(QUERY_BUDGETS={"index": 1}, QUERY_BUDGET_STRICT=True)
+    def test_strict_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse("index"))
+
+    @override_settings(QUERY_BUDGETS={"index": 1}, QUERY_BUDGET_STRICT=False)
+    def test_budget_logged_in_production(self):
+        with self.assertLogs("yatube.middleware", "WARNING") as logs:
+            response = self.client.get(reverse("index"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("index", logs.output[0])
+
+
+class TestSeedData(TestCase):
+    def test_seed_data(self):
+        call_command(
+            "seed_data",
+            users=30,
+            groups=3,
+            posts=200,
+            comments=300,
+            follows=5,
+            batch_size=50,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(FeedEntry.objects.exists())
+        self.assertGreater(
+            Post.objects.values("pub_date").distinct().count(), 100
+        )
+
+        output = io.StringIO()
+        call_command("reconcile_counters", stdout=output)
+        self.assertIn(
+            "Создано записей: 0, исправлено записей: 0.", output.getvalue()
+        )
+        self.assertIn("Исправлено постов: 0.", output.getvalue())
+
+        # Счётчики id сдвинуты за вставленные явно записи.
+        post = Post.objects.create(text="new", author=User.objects.first())
+        self.assertGreater(post.pk, 200)
+
+
+class TestImportJsonl(TestCase):
+    ROWS = [
+        {"type": "user", "username": "importer", "email": "i@example.com"},
+        {"type": "group", "slug": "imported", "title": "Imported"},
+        {"type": "post", "id": 1, "author": "importer", "group": "imported",
+         "text": "first", "pub_date": "2020-01-01T10:00:00+00:00"},
+        {"type": "post", "id": 2, "author": "importer", "text": "second"},
+        {"type": "comment", "post": 1, "author": "importer", "text": "c1",
+         "created": "2020-01-01T11:00:00+00:00"},
+        {"type": "comment", "post": 3, "author": "importer", "text": "lost"},
+    ]
+
+    def write(self, path, lines):
+        with open(path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+
+    def test_import_resumes_after_failure(self):
+        lines = [json.dumps(row) for row in self.ROWS]
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/dump.jsonl"
+            # Пятая строка битая: загрузка падает после двух пачек.
+            self.write(path, lines[:4] + ["{broken"] + lines[5:])
+            with self.assertRaisesMessage(CommandError, "Строка 5"):
+                call_command(
+                    "import_jsonl", path, batch_size=2, stdout=io.StringIO()
+                )
+            self.assertEqual(Post.objects.count(), 2)
+            self.assertTrue(os.path.exists(f"{path}.checkpoint"))
+
+            self.write(path, lines)
+            output = io.StringIO()
+            call_command("import_jsonl", path, batch_size=2, stdout=output)
+            self.assertIn("Продолжение со строки 5.", output.getvalue())
+            self.assertIn("пропущено строк: 1.", output.getvalue())
+            self.assertFalse(os.path.exists(f"{path}.checkpoint"))
+
+        author = User.objects.get(username="importer")
+        self.assertFalse(author.has_usable_password())
+        self.assertEqual(Post.objects.count(), 2)
+        post = Post.objects.get(text="first")
+        self.assertEqual(post.group.slug, "imported")
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.comments.get().author, author)
+        self.assertEqual(author.stats.posts_count, 2)
+
+
+class TestExport(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.reader = User.objects.create_user(username="reader")
+        self.group = Group.objects.create(title="g", slug="g")
+        self.posts = [
+            Post.objects.create(
+                text=f"post, {index}", author=self.author, group=self.group
+            )
+            for index in range(3)
+        ]
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text="ответ"
+        )
+        self.client = Client()
+        self.url = reverse("export", args=[self.author.username])
+
+    def test_export_jsonl_gzip(self):
+        self.client.force_login(self.author)
+        response = self.client.get(self.url, {"gzip": 1})
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn("writer.jsonl.gz", response["Content-Disposition"])
+        data = gzip.decompress(b"".join(response.streaming_content))
+        rows = [json.loads(line) for line in data.decode().splitlines()]
+        self.assertEqual(
+            [row["type"] for row in rows], ["post"] * 3 + ["comment"]
+        )
+        self.assertEqual(rows[0]["group"], "g")
+        self.assertEqual(rows[3]["author"], "reader")
+        self.assertEqual(rows[3]["text"], "ответ")
+
+    def test_export_csv(self):
+        self.client.force_login(self.author)
+        response = self.client.get(self.url, {"format": "csv"})
+        content = b"".join(response.streaming_content).decode()
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0][:3], ["type", "id", "post"])
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[1][5], "post, 0")
+
+    def test_export_is_private(self):
+        self.client.force_login(self.reader)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.reader.is_staff = True
+        self.reader.save()
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_export_command(self):
+        output = io.StringIO()
+        call_command(
+            "export_posts", "writer", export_format="csv", stdout=output
+        )
+        self.assertEqual(len(output.getvalue().splitlines()), 5)
+
+
+class TestConditionalGet(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author")
+        self.reader = User.objects.create_user(username="reader")
+        self.group = Group.objects.create(title="g", slug="g")
+        self.other = Group.objects.create(title="o", slug="o")
+        self.post = Post.objects.create(
+            text="text", author=self.author, group=self.group
+        )
+        self.client = Client()
+
+    def assert_not_modified(self, url):
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        return etag
+
+    def assert_modified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_page(self):
+        url = reverse("post_view", args=["author", self.post.pk])
+        etag = self.assert_not_modified(url)
+        Comment.objects.create(post=self.post, author=self.reader, text="c")
+        self.assert_modified(url, etag)
+        etag = self.assert_not_modified(url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assert_modified(url, etag)
+
+    def test_profile_page(self):
+        url = reverse("profile", args=["author"])
+        etag = self.assert_not_modified(url)
+        Post.objects.create(text="unrelated", author=self.reader)
+        self.assertEqual(self.client.get(url)["ETag"], etag)
+        Comment.objects.create(post=self.post, author=self.reader, text="c")
+        self.assert_modified(url, etag)
+
+    def test_post_delete_does_not_load_post_per_comment(self):
+        url = reverse("profile", args=["author"])
+        for number in range(3):
+            Comment.objects.create(
+                post=self.post, author=self.reader, text=f"c{number}"
+            )
+        comment = self.post.comments.first()
+        etag = self.client.get(url)["ETag"]
+        comment.delete()
+        self.assert_modified(url, etag)
+
+        etag = self.client.get(url)["ETag"]
+        post = Post.objects.get(pk=self.post.pk)
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        self.assertFalse([
+            query["sql"] for query in queries.captured_queries
+            if query["sql"].startswith(("SELECT", "UPDATE"))
+            and '"posts_post"' in query["sql"]
+        ])
+        self.assert_modified(url, etag)
+        self.assertEqual(UserStats.for_user(self.author).posts_count, 0)
+
+    def test_failed_post_delete_keeps_comment_counter(self):
+        comments = [
+            Comment.objects.create(
+                post=self.post, author=self.reader, text=f"c{number}"
+            )
+            for number in range(2)
+        ]
+        with mock.patch(
+            "posts.signals.remove_comment", side_effect=DatabaseError
+        ):
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                Post.objects.get(pk=self.post.pk).delete()
+        comments[0].delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+    def test_group_page(self):
+        url = reverse("group_post", args=["o"])
+        etag = self.assert_not_modified(url)
+        self.post.group = self.other
+        self.post.save()
+        self.assert_modified(url, etag)
+
+        # Пост ушёл и со страницы прежнего сообщества.
+        url = reverse("group_post", args=["g"])
+        etag = self.client.get(url)["ETag"]
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = None
+        post.save()
+        self.assert_modified(reverse("group_post", args=["o"]), etag)
+
+    def test_etag_depends_on_session(self):
+        url = reverse("profile", args=["author"])
+        etag = self.client.get(url)["ETag"]
+        self.client.force_login(self.reader)
+        self.assert_modified(url, etag)
+
+    def test_missing_author(self):
+        response = self.client.get(reverse("profile", args=["nobody"]))
+        self.assertEqual(response.status_code, 404)
+
+
+class TestCommentPages(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.author = User.objects.create_user(username="author")
+        self.post = Post.objects.create(text="text", author=self.author)
+        for number in range(45):
+            Comment.objects.create(
+                post=self.post,
+                author=User.objects.create_user(username=f"reader{number}"),
+                text=f"comment {number}",
+            )
+        self.url = reverse("post_view", args=["author", self.post.pk])
+
+    def texts(self, items):
+        return [comment.text for comment in items]
+
+    def test_first_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        comment_queries = [
+            query for query in queries.captured_queries
+            if 'FROM "posts_comment"' in query["sql"]
+        ]
+        self.assertEqual(len(comment_queries), 1)
+        items = response.context["items"]
+        self.assertEqual(
+            self.texts(items), [f"comment {n}" for n in range(20)]
+        )
+        self.assertContains(response, "Показать ещё")
+        self.assertContains(response, 'name="comment_')
+
+    def test_more_link_ignores_drifted_counter(self):
+        post = Post.objects.create(text="quiet", author=self.author)
+        Post.objects.filter(pk=post.pk).update(comments_count=25)
+        response = self.client.get(
+            reverse("post_view", args=["author", post.pk])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context["items"].next_cursor)
+        self.assertNotContains(response, "Показать ещё")
+
+    def test_fragment_pages(self):
+        cursor = self.client.get(self.url).context["items"].next_cursor
+        url = reverse("post_comments", args=["author", self.post.pk])
+        response = self.client.get(url, {"after": cursor})
+        self.assertTemplateNotUsed(response, "base.html")
+        items = response.context["items"]
+        self.assertEqual(
+            self.texts(items), [f"comment {n}" for n in range(20, 40)]
+        )
+
+        response = self.client.get(url, {"after": items.next_cursor})
+        self.assertEqual(
+            self.texts(response.context["items"]),
+            [f"comment {n}" for n in range(40, 45)],
+        )
+        self.assertNotContains(response, "Показать ещё")
+
+    def test_post_page_after_cursor(self):
+        cursor = self.client.get(self.url).context["items"].next_cursor
+        response = self.client.get(self.url, {"after": cursor})
+        self.assertEqual(
+            self.texts(response.context["items"])[0], "comment 20"
+        )
+        self.assertIsNotNone(response.context["form"])
+
+    def test_short_thread_has_no_more_link(self):
+        post = Post.objects.create(text="quiet", author=self.author)
+        Comment.objects.create(post=post, author=self.author, text="one")
+        response = self.client.get(
+            reverse("post_view", args=["author", post.pk])
+        )
+        self.assertEqual(self.texts(response.context["items"]), ["one"])
+        self.assertNotContains(response, "Показать ещё")
+
+
+class TestPostLoader(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.author = User.objects.create_user(username="author")
+        self.group = Group.objects.create(title="g", slug="g")
+        self.post = Post.objects.create(
+            text="text", author=self.author, group=self.group
+        )
+
+    def test_post_loaded_in_one_query(self):
+        url = reverse("post_view", args=["author", self.post.pk])
+        # Проверка версий страницы, пост с автором и комментарии.
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+            self.assertEqual(response.context["post"].group, self.group)
+            self.assertEqual(response.context["post_count"], 1)
+
+    def test_missing_post(self):
+        User.objects.create_user(username="other")
+        for username, post_id in (
+                ("author", self.post.pk + 1),
+                ("other", self.post.pk),
+                ("nobody", self.post.pk),
+        ):
+            response = self.client.get(
+                reverse("post_view", args=[username, post_id])
+            )
+            self.assertEqual(response.status_code, 404)
+
+
+@override_settings(REPLICA_DATABASES=["replica"])
+class TestReplicaRouting(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def route(self, request, write=False, model=Post):
+        """Возвращает базу чтения внутри запроса и ответ middleware."""
+        databases = []
+
+        def view(request):
+            if write:
+                router.db_for_write(Post)
+            databases.append(router.db_for_read(model))
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return databases[0], response
+
+    def test_reads_go_to_replica(self):
+        database, response = self.route(self.factory.get("/"))
+        self.assertEqual(database, "replica")
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_writes_pin_primary(self):
+        database, response = self.route(self.factory.get("/"), write=True)
+        self.assertEqual(database, "default")
+        self.assertEqual(
+            response.cookies[STICKY_COOKIE]["max-age"],
+            settings.REPLICA_STICKY_SECONDS,
+        )
+        database, _ = self.route(self.factory.post("/"))
+        self.assertEqual(database, "default")
+
+    def test_sticky_cookie_reads_primary(self):
+        request = self.factory.get("/")
+        request.COOKIES[STICKY_COOKIE] = "1"
+        database, _ = self.route(request)
+        self.assertEqual(database, "default")
+
+    def test_outside_requests_read_primary(self):
+        self.assertEqual(router.db_for_read(Post), "default")
+
+    def test_auth_and_sessions_read_primary(self):
+        for model in (Session, User, ContentType):
+            database, _ = self.route(self.factory.get("/"), model=model)
+            self.assertEqual(database, "default")
+
+    def test_replica_pinned_per_request(self):
+        databases = []
+
+        def view(request):
+            for _ in range(10):
+                databases.append(router.db_for_read(Post))
+            return HttpResponse()
+
+        with self.settings(REPLICA_DATABASES=["replica", "other"]):
+            for _ in range(10):
+                ReplicaRoutingMiddleware(view)(self.factory.get("/"))
+        requests = [databases[i:i + 10] for i in range(0, 100, 10)]
+        for reads in requests:
+            self.assertEqual(len(set(reads)), 1)
+        self.assertEqual(set(databases), {"replica", "other"})
+
+    def test_cached_page_keyed_by_replica_generation(self):
+        renders = []
+
+        @cache_page_versioned(key_prefix="replica_test")
+        def view(request):
+            renders.append(router.db_for_read(Post))
+            return HttpResponse()
+
+        cache.clear()
+        generations = iter([1, 1, 2])
+        with mock.patch(
+            "posts.cache.PageGeneration.current",
+            side_effect=lambda: next(generations),
+        ):
+            for _ in range(3):
+                ReplicaRoutingMiddleware(view)(self.factory.get("/"))
+        # Пока реплика не получила новое поколение, страница берётся из
+        # кэша, а после — собирается заново.
+        self.assertEqual(renders, ["replica", "replica"])
+
+
+class TestSyncReplica(TransactionTestCase):
+    def test_sync_replica(self):
+        Post.objects.create(
+            text="copied", author=User.objects.create_user(username="u")
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/replica.sqlite3"
+            call_command("sync_replica", path, stdout=io.StringIO())
+            replica = sqlite3.connect(path)
+            try:
+                rows = replica.execute("SELECT text FROM posts_post").fetchall()
+            finally:
+                replica.close()
+        self.assertEqual(rows, [("copied",)])
+
+
+class TestSQLitePragmas(TestCase):
+    def test_new_connections_get_pragmas(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = connections["default"].__class__(
+                {
+                    **connection.settings_dict,
+                    "NAME": f"{directory}/db.sqlite3",
+                    "PRAGMAS": {
+                        "journal_mode": "WAL",
+                        "synchronous": "NORMAL",
+                        "busy_timeout": 1234,
+                    },
+                },
+                alias="pragmas",
+            )
+            try:
+                with wrapper.cursor() as cursor:
+                    values = [
+                        cursor.execute(f"PRAGMA {name}").fetchone()[0]
+                        for name in (
+                            "journal_mode", "synchronous", "busy_timeout"
+                        )
+                    ]
+            finally:
+                wrapper.close()
+        self.assertEqual(values, ["wal", 1, 1234])
+
+
+class TestSettingsProfiles(TestCase):
+    def test_prod_profile(self):
+        environ = {
+            "DJANGO_SECRET_KEY": "secret",
+            "DJANGO_ALLOWED_HOSTS": "example.com,www.example.com",
+        }
+        with mock.patch.dict(os.environ, environ):
+            sys.modules.pop("yatube.settings.prod", None)
+            prod = importlib.import_module("yatube.settings.prod")
+        self.assertFalse(prod.DEBUG)
+        self.assertFalse(prod.QUERY_BUDGET_STRICT)
+        self.assertFalse(prod.QUERY_TIMING_HEADER)
+        self.assertEqual(prod.SECRET_KEY, "secret")
+        self.assertEqual(
+            prod.ALLOWED_HOSTS, ["example.com", "www.example.com"]
+        )
+        self.assertNotIn("debug_toolbar", prod.INSTALLED_APPS)
+        self.assertFalse(
+            any("debug_toolbar" in name for name in prod.MIDDLEWARE)
+        )
+        loader, _ = prod.TEMPLATES[0]["OPTIONS"]["loaders"][0]
+        self.assertEqual(loader, "django.template.loaders.cached.Loader")
+        self.assertFalse(prod.TEMPLATES[0]["APP_DIRS"])
+
+
+class TestFollowToggle(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username="reader")
+        self.author = User.objects.create_user(username="author")
+        self.fan = User.objects.create_user(username="fan")
+        Post.objects.create(text="text", author=self.author)
+        self.client.force_login(self.user)
+        self.url = reverse("profile_follow_toggle", args=["author"])
+
+    def follow_queries(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            result = func(self.user.pk, self.author.pk)
+        return result, [
+            query["sql"] for query in queries.captured_queries
+            if re.match(r"(INSERT|DELETE)\b.*? posts_follow ", query["sql"])
+        ]
+
+    def test_follow_is_single_idempotent_statement(self):
+        created, queries = self.follow_queries(Follow.follow)
+        self.assertTrue(created)
+        self.assertEqual(len(queries), 1)
+        created, queries = self.follow_queries(Follow.follow)
+        self.assertFalse(created)
+        self.assertEqual(len(queries), 1)
+
+        self.assertEqual(self.author.following.count(), 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 1
+        )
+        self.assertTrue(FeedEntry.objects.filter(user=self.user).exists())
+
+    def test_unfollow_is_single_idempotent_statement(self):
+        Follow.follow(self.user.pk, self.author.pk)
+        removed, queries = self.follow_queries(Follow.unfollow)
+        self.assertTrue(removed)
+        self.assertEqual(len(queries), 1)
+        removed, _ = self.follow_queries(Follow.unfollow)
+        self.assertFalse(removed)
+
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(stats.followers_count, 0)
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+
+    def test_toggle_endpoint(self):
+        response = self.client.post(self.url, {"follow": "1"})
+        self.assertEqual(
+            response.json(), {"following": True, "followers": 1}
+        )
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        # Двойной клик не создаёт вторую подписку.
+        response = self.client.post(self.url, {"follow": "1"})
+        self.assertEqual(response.json()["followers"], 1)
+
+        response = self.client.post(self.url)
+        self.assertEqual(
+            response.json(), {"following": False, "followers": 0}
+        )
+        response = self.client.post(self.url)
+        self.assertEqual(response.json()["following"], True)
+
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+
+    def test_button_reflects_viewer(self):
+        Follow.follow(self.fan.pk, self.author.pk)
+        url = reverse("profile", args=["author"])
+        response = self.client.get(url)
+        self.assertFalse(response.context["is_following"])
+        self.assertContains(response, "Подписаться</a>")
+
+        Follow.follow(self.user.pk, self.author.pk)
+        response = self.client.get(url)
+        self.assertTrue(response.context["is_following"])
+        self.assertContains(response, "Отписаться</a>")
+
+        post = self.author.posts.get()
+        response = self.client.get(
+            reverse("post_view", args=["author", post.pk])
+        )
+        self.assertTrue(response.context["is_following"])
+
+
+class TestRecommendations(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.users = {
+            name: User.objects.create_user(username=name)
+            for name in ("me", "friend", "star", "fan", "other", "loner")
+        }
+        for user, author in (
+                ("me", "friend"), ("friend", "star"), ("friend", "other"),
+                ("fan", "friend"), ("fan", "other"), ("star", "me"),
+        ):
+            Follow.follow(self.users[user].pk, self.users[author].pk)
+        self.me = self.users["me"]
+
+    def candidates(self, user):
+        return list(Recommendation.objects.filter(user=user).values_list(
+            "candidate__username", flat=True
+        ))
+
+    def test_graph_scores(self):
+        graph = FollowGraph.load()
+        recommended = graph.recommend(self.me.pk)
+        ids = [candidate for candidate, _, _ in recommended]
+        # Друг подписан на обоих, а other ещё и у другого читателя друга.
+        self.assertEqual(
+            ids, [self.users["other"].pk, self.users["star"].pk]
+        )
+        self.assertEqual([mutual for _, _, mutual in recommended], [1, 1])
+        self.assertNotIn(self.me.pk, ids)
+        self.assertNotIn(self.users["friend"].pk, ids)
+
+    def test_partial_graph_matches_full(self):
+        full = FollowGraph.load()
+        ids = [user.pk for user in self.users.values()]
+        for user in ids:
+            self.assertEqual(
+                FollowGraph.load_for([user]).recommend(user),
+                full.recommend(user),
+            )
+        with mock.patch("posts.recommendations.CO_FOLLOW_MAX_FANS", 1):
+            full = FollowGraph.load()
+            partial = FollowGraph.load_for(ids)
+            for user in ids:
+                self.assertEqual(
+                    partial.recommend(user), full.recommend(user)
+                )
+
+    def test_compute_and_serve(self):
+        call_command("compute_recommendations", stdout=io.StringIO())
+        self.assertEqual(self.candidates(self.me), ["other", "star"])
+        self.assertFalse(RecommendationQueue.objects.exists())
+
+        self.client.force_login(self.me)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("profile", args=["me"]))
+        self.assertContains(response, "Кого почитать")
+        self.assertContains(response, "@star")
+        self.assertFalse(any(
+            "posts_follow" in query["sql"] and "posts_recommendation" in
+            query["sql"] for query in queries.captured_queries
+        ))
+        response = self.client.get(reverse("follow_index"))
+        self.assertContains(response, "@other")
+        response = self.client.get(reverse("profile", args=["friend"]))
+        self.assertNotContains(response, "Кого почитать")
+
+    def test_follow_changes_are_queued(self):
+        call_command("compute_recommendations", stdout=io.StringIO())
+        Follow.follow(self.me.pk, self.users["star"].pk)
+        # Автор сразу пропадает из рекомендаций, остальное — в очереди.
+        self.assertEqual(self.candidates(self.me), ["other"])
+        self.assertEqual(
+            set(RecommendationQueue.objects.values_list(
+                "user__username", flat=True
+            )),
+            {"me"},
+        )
+
+        call_command(
+            "compute_recommendations", incremental=True, stdout=io.StringIO()
+        )
+        self.assertFalse(RecommendationQueue.objects.exists())
+        self.assertEqual(self.candidates(self.me), ["other"])
+        # star читает me, а me теперь читает star.
+        self.assertEqual(self.candidates(self.users["star"]), ["friend"])
+
+        Follow.unfollow(self.me.pk, self.users["friend"].pk)
+        call_command(
+            "compute_recommendations", incremental=True, stdout=io.StringIO()
+        )
+        # other остался только через общего автора star.
+        recommendation = Recommendation.objects.get(user=self.me)
+        self.assertEqual(recommendation.candidate, self.users["other"])
+        self.assertEqual(recommendation.mutual_count, 0)
+
+
+class TestTrending(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.author = User.objects.create_user(username="author")
+        self.reader = User.objects.create_user(username="reader")
+        self.cats = Group.objects.create(title="Коты", slug="cats")
+        self.dogs = Group.objects.create(title="Собаки", slug="dogs")
+        self.quiet = Post.objects.create(
+            text="тихий пост", author=self.author, group=self.cats
+        )
+        self.hot = Post.objects.create(
+            text="горячий пост", author=self.author, group=self.cats
+        )
+        self.other = Post.objects.create(
+            text="про собак", author=self.reader, group=self.dogs
+        )
+        for _ in range(3):
+            Comment.objects.create(
+                post=self.hot, author=self.reader, text="текст"
+            )
+        Comment.objects.create(
+            post=self.other, author=self.author, text="текст"
+        )
+
+    def counts(self, kind):
+        return dict(ActivityBucket.objects.filter(kind=kind).values_list(
+            "object_id", "count"
+        ))
+
+    def test_events_are_counted_per_hour(self):
+        self.assertEqual(
+            self.counts(ActivityBucket.POST),
+            {self.hot.pk: 3, self.other.pk: 1},
+        )
+        self.assertEqual(
+            self.counts(ActivityBucket.GROUP),
+            {self.cats.pk: 5, self.dogs.pk: 2},
+        )
+        Follow.follow(self.reader.pk, self.author.pk)
+        self.assertEqual(
+            self.counts(ActivityBucket.AUTHOR), {self.author.pk: 1}
+        )
+
+    def test_comment_reads_group_with_counter_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            Comment.objects.create(
+                post_id=self.other.pk, author=self.author, text="текст"
+            )
+        self.assertFalse([
+            query["sql"] for query in queries.captured_queries
+            if query["sql"].startswith("SELECT")
+            and 'FROM "posts_post"' in query["sql"]
+        ])
+        self.assertEqual(self.counts(ActivityBucket.GROUP)[self.dogs.pk], 3)
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.comments_count, 2)
+
+    def test_rollup(self):
+        old = ActivityBucket.objects.create(
+            kind=ActivityBucket.POST,
+            object_id=self.quiet.pk,
+            hour=timezone.now() - timedelta(days=2),
+            count=100,
+        )
+        call_command("rollup_trending", stdout=io.StringIO())
+        self.assertFalse(ActivityBucket.objects.filter(pk=old.pk).exists())
+        self.assertEqual(
+            list(TrendingPost.objects.order_by("-score").values_list(
+                "post", flat=True
+            )),
+            [self.hot.pk, self.other.pk],
+        )
+        self.assertEqual(
+            TrendingPost.objects.get(post=self.hot).group, self.cats
+        )
+        self.assertEqual(
+            list(TrendingGroup.objects.order_by("-score").values_list(
+                "group", flat=True
+            )),
+            [self.cats.pk, self.dogs.pk],
+        )
+
+        # Новые подписчики поднимают свежие посты автора.
+        for number in range(10):
+            fan = User.objects.create_user(username=f"fan{number}")
+            Follow.follow(fan.pk, self.reader.pk)
+        call_command("rollup_trending", stdout=io.StringIO())
+        self.assertEqual(
+            TrendingPost.objects.order_by("-score").first().post, self.other
+        )
+
+    def test_pages_read_rollup(self):
+        call_command("rollup_trending", stdout=io.StringIO())
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("trending"))
+        self.assertEqual(
+            list(response.context["posts"]), [self.hot, self.other]
+        )
+        self.assertEqual(
+            list(response.context["groups"]), [self.cats, self.dogs]
+        )
+        for query in queries.captured_queries:
+            self.assertNotIn("posts_comment", query["sql"])
+            self.assertNotIn("posts_activitybucket", query["sql"])
+
+        response = self.client.get(reverse("group_post", args=["cats"]))
+        self.assertEqual(list(response.context["trending"]), [self.hot])
+        self.assertContains(response, "Популярное в сообществе")
+        response = self.client.get(reverse("group_post", args=["dogs"]))
+        self.assertEqual(list(response.context["trending"]), [self.other])
+
+
+@override_settings(THROTTLE_RATES={"post": (2, 60), "follow": (3, 30)})
+class TestThrottle(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username="writer")
+        self.author = User.objects.create_user(username="author")
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def new_post(self, client=None):
+        return (client or self.client).post(
+            reverse("post_new"), {"text": "text"}
+        )
+
+    def test_token_bucket(self):
+        self.assertEqual(take_token("bucket", 2, 10, now=100), 0)
+        self.assertEqual(take_token("bucket", 2, 10, now=100), 0)
+        self.assertEqual(take_token("bucket", 2, 10, now=100), 5)
+        # Токен возвращается через 5 секунд, но не больше размера корзины.
+        self.assertEqual(take_token("bucket", 2, 10, now=105), 0)
+        self.assertEqual(take_token("bucket", 2, 10, now=105), 5)
+
+    def test_throttled_write_skips_database(self):
+        self.assertEqual(self.new_post().status_code, 302)
+        self.assertEqual(self.new_post().status_code, 302)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.new_post()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(Post.objects.count(), 2)
+        # Форма по GET токены не тратит.
+        self.assertEqual(self.client.get(reverse("post_new")).status_code, 200)
+
+    def test_buckets_per_ip_and_user(self):
+        self.new_post()
+        self.new_post()
+        other = Client(REMOTE_ADDR="10.0.0.2")
+        other.force_login(self.author)
+        self.assertEqual(self.new_post(other).status_code, 302)
+        # Тот же пользователь с другого адреса и в новой сессии ограничен
+        # своей корзиной.
+        moved = Client(REMOTE_ADDR="10.0.0.3")
+        moved.force_login(self.user)
+        self.assertEqual(self.new_post(moved).status_code, 429)
+
+    def test_user_bucket_refuses_without_database(self):
+        self.new_post()
+        self.assertIn(THROTTLE_COOKIE, self.client.cookies)
+        self.new_post()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("post_new"), {"text": "text"},
+                REMOTE_ADDR="10.0.0.9",
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(len(queries), 0)
+
+    def test_throttle_cookie_bound_to_session(self):
+        self.new_post()
+        self.new_post()
+        # Cookie чужой сессии не подменяет пользователя.
+        other = Client(REMOTE_ADDR="10.0.0.2")
+        other.force_login(self.author)
+        other.cookies[THROTTLE_COOKIE] = self.client.cookies[THROTTLE_COOKIE]
+        self.assertEqual(self.new_post(other).status_code, 302)
+        moved = Client(REMOTE_ADDR="10.0.0.3")
+        moved.force_login(self.user)
+        moved.cookies[THROTTLE_COOKIE] = other.cookies[THROTTLE_COOKIE]
+        self.assertEqual(self.new_post(moved).status_code, 429)
+
+    def test_refused_request_returns_tokens(self):
+        self.new_post()
+        self.new_post()
+        # Адрес 10.0.0.2 ещё не тратил токены, но пользователь упёрся
+        # в лимит, и токен адреса возвращается.
+        moved = Client(REMOTE_ADDR="10.0.0.2")
+        moved.force_login(self.user)
+        for _ in range(3):
+            self.assertEqual(self.new_post(moved).status_code, 429)
+        other = Client(REMOTE_ADDR="10.0.0.2")
+        other.force_login(self.author)
+        self.assertEqual(self.new_post(other).status_code, 302)
+        self.assertEqual(self.new_post(other).status_code, 302)
+
+    def test_follow_links_share_limit(self):
+        follow = reverse("profile_follow", args=["author"])
+        unfollow = reverse("profile_unfollow", args=["author"])
+        for url in (follow, unfollow, follow):
+            self.assertEqual(self.client.get(url).status_code, 302)
+        self.assertEqual(self.client.get(unfollow).status_code, 429)
+        response = self.client.post(
+            reverse("profile_follow_toggle", args=["author"])
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(Follow.objects.filter(user=self.user).exists())
@@ -0,0 +1,238 @@
+"""Фоновое создание миниатюр изображений постов.
+
+Миниатюры всех размеров из POST_THUMBNAILS строятся пулом потоков сразу
+после сохранения поста, а шаблоны только ищут готовую миниатюру в
+хранилище sorl-thumbnail и не декодируют изображения во время запроса.
+
+Изображение поста нарезается по ширинам POST_IMAGE_WIDTHS в WebP и JPEG:
+браузер сам выбирает из srcset вариант под ширину экрана, а JPEG
+остаётся для браузеров без поддержки WebP.
+
+Пока задача изображения в очереди или выполняется, в кэше лежит её
+отметка, и страницы, не нашедшие миниатюр, новых задач не ставят.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as BaseKVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from posts.cache import bump_generation, bump_versions
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+# Ширины вариантов изображения поста. Пропорции у всех вариантов те же,
+# что у карточки шириной 960 пикселей.
+POST_IMAGE_WIDTHS = (320, 640, 960)
+POST_IMAGE_RATIO = 339 / 960
+# Форматы с их параметрами: первым идёт предпочтительный формат,
+# последним — запасной для <img>. WebP при качестве 80 визуально не
+# уступает JPEG с качеством sorl по умолчанию и в разы меньше.
+POST_IMAGE_FORMATS = {
+    "WEBP": {"quality": 80},
+    "JPEG": {},
+}
+POST_IMAGE_SIZES = "(max-width: 960px) 100vw, 960px"
+
+
+def variant_geometry(width):
+    """Размер варианта изображения шириной width."""
+    return f"{width}x{round(width * POST_IMAGE_RATIO)}"
+
+
+# Все варианты, в которых шаблоны выводят изображения постов.
+POST_THUMBNAILS = [
+    (variant_geometry(width),
+     {"crop": "center", "upscale": True, "format": image_format, **options})
+    for image_format, options in POST_IMAGE_FORMATS.items()
+    for width in POST_IMAGE_WIDTHS
+]
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_JOB_KEY = "thumbnails.job.{}"
+# Отметка задачи истекает сама, если поток не снял её, например, при
+# остановке процесса.
+THUMBNAIL_JOB_TIMEOUT = 300
+
+_executor = ThreadPoolExecutor(
+    max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnails"
+)
+
+
+class KVStore(BaseKVStore):
+    """Хранилище sorl-thumbnail с чтением нескольких миниатюр сразу."""
+
+    def get_many(self, image_files):
+        """Возвращает записи image_files из кэша и одним запросом к базе."""
+        keys = [add_prefix(image_file.key) for image_file in image_files]
+        values = self.cache.get_many(keys)
+        missing = [key for key in keys if values.get(key) is None]
+        if missing:
+            found = dict(
+                KVStoreModel.objects.filter(key__in=missing)
+                .values_list("key", "value")
+            )
+            # Отсутствие записи тоже кэшируется, как в _get_raw.
+            found = {key: found.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(found, settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(found)
+        return [
+            None if values[key] == EMPTY_VALUE
+            else deserialize_image_file(values[key])
+            for key in keys
+        ]
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    """Бэкенд sorl-thumbnail с поиском миниатюр без их создания."""
+
+    def _thumbnail_file(self, source, geometry_string, options):
+        options = dict(options)
+        # Параметры дополняются так же, как в get_thumbnail, иначе имя
+        # миниатюры не совпадёт с созданной.
+        if settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault("format", self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_thumbnail_files(self, file_, variants):
+        """Миниатюры file_ для пар (размер, параметры), без проверки наличия.
+
+        Готовые миниатюры ищутся по ним в хранилище sorl-thumbnail, при
+        этом исходное изображение не открывается.
+        """
+        source = ImageFile(file_)
+        return [
+            self._thumbnail_file(source, geometry, options)
+            for geometry, options in variants
+        ]
+
+
+def job_key(name):
+    """Ключ кэша с отметкой задачи для изображения name."""
+    return THUMBNAIL_JOB_KEY.format(hashlib.sha1(name.encode()).hexdigest())
+
+
+def generate_thumbnails(name):
+    """Создаёт недостающие миниатюры изображения с именем name."""
+    try:
+        thumbnails = default.kvstore.get_many(
+            default.backend.get_thumbnail_files(name, POST_THUMBNAILS)
+        )
+        missing = [
+            variant
+            for variant, thumbnail in zip(POST_THUMBNAILS, thumbnails)
+            if not thumbnail
+        ]
+        for geometry, options in missing:
+            get_thumbnail(name, geometry, **options)
+        if missing:
+            # Карточки и страницы, собранные с исходным изображением,
+            # пересобираются уже с миниатюрой, а ETag страниц постов
+            # меняется вместе с версиями.
+            posts = Post.objects.filter(image=name)
+            owners = list(posts.values_list("pk", "author_id", "group_id"))
+            posts.update(updated=timezone.now())
+            bump_versions(
+                scope
+                for pk, author_id, group_id in owners
+                for scope in (
+                    ("post", pk), ("user", author_id), ("group", group_id)
+                )
+            )
+            bump_generation()
+    except Exception:
+        logger.exception("Не удалось создать миниатюры для %s", name)
+    finally:
+        cache.delete(job_key(name))
+        # Соединения с базой в потоке пула открыты только для этой задачи.
+        connections.close_all()
+
+
+def submit_thumbnails(name):
+    """Отдаёт создание миниатюр name пулу, если задача ещё не поставлена.
+
+    Отметка ставится через cache.add, поэтому из одновременных запросов
+    задачу ставит только один.
+    """
+    if cache.add(job_key(name), True, THUMBNAIL_JOB_TIMEOUT):
+        _executor.submit(generate_thumbnails, name)
+
+
+def schedule_thumbnails(image):
+    """Ставит создание миниатюр в очередь после фиксации транзакции."""
+    if image:
+        name = image.name
+        transaction.on_commit(lambda: submit_thumbnails(name))
+
+
+def prefetch_variants(images):
+    """Загружает записи о миниатюрах изображений images одним запросом.
+
+    Записи попадают в кэш, и следующие вызовы image_variants для этих
+    изображений уже не обращаются к базе.
+    """
+    files = [
+        thumbnail
+        for image in images if image
+        for thumbnail in default.backend.get_thumbnail_files(
+            image, POST_THUMBNAILS
+        )
+    ]
+    if files:
+        try:
+            default.kvstore.get_many(files)
+        except Exception:
+            logger.exception("Не удалось загрузить записи о миниатюрах")
+
+
+def image_variants(image):
+    """Возвращает готовые варианты изображения для тега <picture>.
+
+    Результат — словарь с srcset для каждого формата (ключи webp и jpeg),
+    адресом src самого крупного запасного варианта и атрибутом sizes.
+    Если какой-то вариант ещё не создан, создание ставится в очередь,
+    а страница пока получает только исходное изображение.
+    """
+    if not image:
+        return None
+    try:
+        thumbnails = default.kvstore.get_many(
+            default.backend.get_thumbnail_files(image, POST_THUMBNAILS)
+        )
+        if not all(thumbnails):
+            submit_thumbnails(image.name)
+            return {"src": image.url}
+        srcsets = {}
+        for (_, options), thumbnail in zip(POST_THUMBNAILS, thumbnails):
+            srcsets.setdefault(options["format"].lower(), []).append(
+                (thumbnail.width, thumbnail.url)
+            )
+    except Exception:
+        logger.exception("Не удалось найти миниатюры для %s", image)
+        return None
+
+    variants = {
+        image_format: ", ".join(f"{url} {width}w" for width, url in urls)
+        for image_format, urls in srcsets.items()
+    }
+    variants["src"] = max(srcsets[list(POST_IMAGE_FORMATS)[-1].lower()])[1]
+    variants["sizes"] = POST_IMAGE_SIZES
+    return variants
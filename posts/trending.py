@@ -0,0 +1,93 @@
+"""Популярные посты и сообщества по скользящему окну активности.
+
+События копятся в почасовых счётчиках ActivityBucket. rollup_trending
+читает счётчики за последние TRENDING_WINDOW и пересобирает таблицы
+TrendingPost и TrendingGroup; страницы читают их по индексу и таблицы
+постов и комментариев не агрегируют.
+
+Вклад часа затухает вдвое каждые HALF_LIFE. Пост набирает очки за
+комментарии, а посты, опубликованные внутри окна, — ещё и за новых
+подписчиков автора с весом FOLLOW_WEIGHT. Сообщество набирает очки за
+новые посты и комментарии к ним.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from posts.cache import bump_generation, bump_versions
+from posts.management.bulk import batches
+from posts.models import (
+    ActivityBucket, Group, Post, TrendingGroup, TrendingPost
+)
+
+TRENDING_WINDOW = timedelta(hours=24)
+HALF_LIFE = timedelta(hours=6)
+FOLLOW_WEIGHT = 0.5
+TRENDING_LIMIT = 20
+GROUP_TRENDING_LIMIT = 5
+BATCH_SIZE = 500
+
+
+def decayed_counts(since, now):
+    """Затухающие суммы счётчиков окна: {вид: {id: очки}}."""
+    totals = defaultdict(lambda: defaultdict(float))
+    buckets = ActivityBucket.objects.filter(hour__gte=since).values_list(
+        "kind", "object_id", "hour", "count"
+    )
+    for kind, object_id, hour, count in buckets.iterator():
+        age = (now - hour) / HALF_LIFE
+        totals[kind][object_id] += count * 0.5 ** age
+    return totals
+
+
+def post_scores(totals, since):
+    """Очки постов окна: {id поста: (id сообщества, очки)}."""
+    scores = defaultdict(float, totals[ActivityBucket.POST])
+    authors = totals[ActivityBucket.AUTHOR]
+    for batch in batches(authors, BATCH_SIZE):
+        recent = Post.objects.filter(
+            author_id__in=batch, pub_date__gte=since
+        ).values_list("pk", "author_id")
+        for pk, author_id in recent:
+            scores[pk] += authors[author_id] * FOLLOW_WEIGHT
+    result = {}
+    for batch in batches(scores, BATCH_SIZE):
+        for pk, group_id in Post.objects.filter(pk__in=batch).values_list(
+                "pk", "group_id"
+        ):
+            result[pk] = (group_id, scores[pk])
+    return result
+
+
+def rollup(now=None):
+    """Пересобирает списки популярного и удаляет счётчики старше окна.
+
+    Возвращает число популярных постов и сообществ.
+    """
+    now = now or timezone.now()
+    since = now - TRENDING_WINDOW
+    totals = decayed_counts(since, now)
+    posts = post_scores(totals, since)
+    group_ids = set(Group.objects.values_list("pk", flat=True))
+    groups = {
+        pk: score for pk, score in totals[ActivityBucket.GROUP].items()
+        if pk in group_ids
+    }
+    with transaction.atomic():
+        ActivityBucket.objects.filter(hour__lt=since).delete()
+        TrendingPost.objects.all().delete()
+        TrendingGroup.objects.all().delete()
+        TrendingPost.objects.bulk_create(
+            TrendingPost(post_id=pk, group_id=group_id, score=score)
+            for pk, (group_id, score) in posts.items()
+        )
+        TrendingGroup.objects.bulk_create(
+            TrendingGroup(group_id=pk, score=score)
+            for pk, score in groups.items()
+        )
+        # Раздел популярного виден на страницах всех сообществ.
+        bump_versions(("group", pk) for pk in group_ids)
+        bump_generation()
+    return len(posts), len(groups)
@@ -1,42 +1,108 @@
 from datetime import datetime
 
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.core.exceptions import PermissionDenied
+from django.db.models import Exists, F, OuterRef
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import require_POST
 
+from posts.cache import cache_page_versioned, condition_versioned
+from posts.export import EXPORT_FORMATS
+from posts.export import export as export_posts
 from posts.forms import CommentForm, PostForm
-from posts.models import Follow, Group, Post, User
+from posts.models import Follow, Group, Post, User, UserStats
+from posts.paginators import (
+    COMMENT_ORDERING, COMMENTS_PAGE_SIZE, CursorPaginator, paginate
+)
+from posts.search import search as search_posts
+from posts.trending import GROUP_TRENDING_LIMIT, TRENDING_LIMIT
+from yatube.throttling import throttle
 
+# Лента подписок сортируется по полям FeedEntry, чтобы читаться по индексу.
+FEED_ORDERING = ("-feed_date", "-feed_post")
 
-@cache_page(20, key_prefix="index_page")
+
+def group_scopes(slug):
+    """Версия страницы сообщества по его адресу."""
+    pks = Group.objects.filter(slug=slug).values_list("pk", flat=True)
+    return [("group", pk) for pk in pks] or None
+
+
+def profile_scopes(username):
+    """Версия страницы пользователя по его имени."""
+    pks = User.objects.filter(username=username).values_list("pk", flat=True)
+    return [("user", pk) for pk in pks] or None
+
+
+def post_scopes(username, post_id):
+    """Версии поста и его автора, чьи счётчики видны на странице."""
+    authors = Post.objects.filter(
+        pk=post_id, author__username=username
+    ).order_by().values_list("author_id", flat=True)
+    return [
+        scope for author in authors
+        for scope in (("post", post_id), ("user", author))
+    ] or None
+
+
+@cache_page_versioned(key_prefix="index_page")
 def index(request):
     """Функция для формирования главной страницы."""
     post_list = Post.objects.select_related("author", "group").all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get("page")
-    page_index = paginator.get_page(page_number)
     return render(
         request,
         "index.html",
-        {"page": page_index, "paginator": paginator, "index": "index"}
+        {**paginate(request, post_list), "index": "index"}
     )
 
 
+@condition_versioned(group_scopes)
+@cache_page_versioned(key_prefix="group_page")
 def group_post(request, slug):
     """Функция для формирования страницы сообщества."""
     group = get_object_or_404(Group, slug=slug)
     post_list = group.posts.select_related("author", "group").all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get("page")
-    page_group = paginator.get_page(page_number)
+    trending = Post.objects.filter(trending__group=group).select_related(
+        "author"
+    ).order_by("-trending__score")[:GROUP_TRENDING_LIMIT]
     return render(
         request,
         "group.html",
-        {"group": group, "page": page_group, "paginator": paginator},
+        {
+            "group": group,
+            "trending": trending,
+            **paginate(request, post_list),
+        },
+    )
+
+
+@cache_page_versioned(key_prefix="trending_page")
+def trending(request):
+    """Функция для формирования страницы популярного."""
+    posts = Post.objects.filter(trending__isnull=False).select_related(
+        "author", "group"
+    ).order_by("-trending__score")[:TRENDING_LIMIT]
+    groups = Group.objects.filter(trending__isnull=False).order_by(
+        "-trending__score"
+    )[:TRENDING_LIMIT]
+    return render(
+        request, "trending.html", {"posts": posts, "groups": groups}
+    )
+
+
+@cache_page_versioned(key_prefix="search_page")
+def search(request):
+    """Функция для формирования страницы поиска по постам."""
+    query = request.GET.get("q", "").strip()
+    return render(
+        request,
+        "search.html",
+        {"query": query, **search_posts(request, query)},
     )
 
 
+@throttle("post", methods=("POST",))
 @login_required()
 def post_new(request):
     """Функция проверки и сохранения данных из формы Post."""
@@ -50,54 +116,108 @@ def post_new(request):
     return render(request, "new_post.html", {"form": form, "content": content})
 
 
+@condition_versioned(profile_scopes)
+@cache_page_versioned(key_prefix="profile_page")
 def profile(request, username):
     """Функция для формирования страницы пользователя."""
-    author = get_object_or_404(User, username=username)
-    follower = author.follower.count()
-    following = author.following.count()
+    author = get_object_or_404(
+        User.objects.select_related("stats").annotate(
+            is_following=is_following(request.user, "pk")
+        ),
+        username=username,
+    )
+    stats = UserStats.for_user(author)
     post_list = author.posts.select_related("author", "group").all()
-    post_count = author.posts.count()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get("page")
-    page_author = paginator.get_page(page_number)
     return render(
         request,
         "profile.html",
         {
             "author": author,
-            "follower": follower,
-            "following": following,
-            "page": page_author,
-            "post_count": post_count,
-            "paginator": paginator,
+            "follower": stats.following_count,
+            "following": stats.followers_count,
+            "is_following": author.is_following,
+            "post_count": stats.posts_count,
+            **paginate(request, post_list),
         }
     )
 
 
+def is_following(user, author_field):
+    """Подзапрос: подписан ли user на автора из поля author_field."""
+    return Exists(Follow.objects.filter(
+        user_id=user.pk, author=OuterRef(author_field)
+    ))
+
+
+def get_post_or_404(username, post_id, user):
+    """Пост с автором, его счётчиками и сообществом одним запросом.
+
+    Заодно проверяется, подписан ли user на автора поста.
+    """
+    return get_object_or_404(
+        Post.objects.select_related("author", "author__stats", "group")
+        .annotate(is_following=is_following(user, "author")),
+        id=post_id,
+        author__username=username,
+    )
+
+
+@condition_versioned(post_scopes)
 def post_view(request, username, post_id):
     """Функция для формирования страницы поста."""
-    author = get_object_or_404(User, username=username)
-    follower = author.follower.count()
-    following = author.following.count()
-    post = author.posts.get(id=post_id)
-    post_count = author.posts.count()
+    post = get_post_or_404(username, post_id, request.user)
+    author = post.author
+    stats = UserStats.for_user(author)
     form = CommentForm()
-    items = post.comments.all()
+    paginator = comment_paginator(post)
+    items = paginator.page(after=request.GET.get("after"))
     return render(
         request,
         "post.html",
         {
             "author": author,
-            "follower": follower,
-            "following": following,
+            "follower": stats.following_count,
+            "following": stats.followers_count,
+            "is_following": post.is_following,
             "post": post,
-            "post_count": post_count,
+            "post_count": stats.posts_count,
             "form": form,
+            # Все комментарии поста без выполнения запроса; страница
+            # из них — в items.
+            "comments": paginator.object_list,
             "items": items
         }
     )
 
 
+def comment_paginator(post):
+    """Курсорный пагинатор комментариев поста вместе с их авторами."""
+    return CursorPaginator(
+        post.comments.select_related("author"),
+        COMMENTS_PAGE_SIZE,
+        ordering=COMMENT_ORDERING,
+    )
+
+
+def post_comments(request, username, post_id):
+    """Функция для подгрузки следующей страницы комментариев поста."""
+    post = get_object_or_404(
+        Post.objects.select_related("author"),
+        author__username=username,
+        id=post_id,
+    )
+    return render(
+        request,
+        "incudes/comment_list.html",
+        {
+            "post": post,
+            "items": comment_paginator(post).page(
+                after=request.GET.get("after")
+            ),
+        },
+    )
+
+
 @login_required()
 def post_edit(request, username, post_id):
     """Функция редактирования данных из формы Post."""
@@ -111,7 +231,11 @@ def post_edit(request, username, post_id):
     )
 
     if form.is_valid():
-        form.save()
+        # Сохраняются только поля формы: comments_count меняется
+        # сигналами комментариев, и копия из загруженного поста его
+        # не перезаписывает.
+        post = form.save(commit=False)
+        post.save(update_fields=[*form._meta.fields, "updated"])
         return redirect("post_view", username=username, post_id=post_id)
     return render(
         request,
@@ -120,6 +244,7 @@ def post_edit(request, username, post_id):
     )
 
 
+@throttle("comment", methods=("POST",))
 @login_required()
 def add_comment(request, username, post_id):
     """Функция для добавления комментария к посту."""
@@ -135,38 +260,102 @@ def add_comment(request, username, post_id):
 
 
 @login_required()
+@cache_page_versioned(key_prefix="follow_page")
 def follow_index(request):
     """Функция для формирования страницы с подписками."""
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get("page")
-    page_index = paginator.get_page(page_number)
+    post_list = Post.objects.filter(
+        feed_entries__user=request.user
+    ).annotate(
+        feed_date=F("feed_entries__pub_date"),
+        feed_post=F("feed_entries__post_id"),
+    ).select_related("author", "group")
     return render(
         request,
         "follow.html",
-        {"page": page_index, "paginator": paginator, "follow": "follow"}
+        {
+            **paginate(request, post_list, ordering=FEED_ORDERING),
+            "follow": "follow",
+        }
     )
 
 
+@throttle("follow")
 @login_required()
 def profile_follow(request, username):
     """Функция для подписки на автора."""
     author = get_object_or_404(User, username=username)
     if request.user != author:
-        Follow.objects.get_or_create(author=author, user=request.user)
+        Follow.follow(request.user.pk, author.pk)
     return redirect("profile", username=username)
 
 
-@ login_required()
+@throttle("follow")
+@login_required()
 def profile_unfollow(request, username):
     """Функция для отписки от автора."""
     author = get_object_or_404(User, username=username)
-    if Follow.objects.filter(author=author, user=request.user).exists():
-        follow = Follow.objects.get(author=author, user=request.user)
-        follow.delete()
+    Follow.unfollow(request.user.pk, author.pk)
     return redirect("profile", username=username)
 
 
+@throttle("follow")
+@login_required()
+@require_POST
+def profile_follow_toggle(request, username):
+    """Функция для подписки и отписки без перезагрузки страницы.
+
+    Поле follow задаёт нужное состояние («1» или «0»), без него подписка
+    переключается. Ответ содержит новое состояние и число подписчиков.
+    """
+    author = get_object_or_404(User, username=username)
+    if request.user == author:
+        return JsonResponse(
+            {"error": "Нельзя подписаться на самого себя."}, status=400
+        )
+    wanted = request.POST.get("follow")
+    if wanted is None:
+        # Если отписываться было не от чего, пользователь подписывается.
+        following = not Follow.unfollow(request.user.pk, author.pk)
+        if following:
+            Follow.follow(request.user.pk, author.pk)
+    elif wanted == "1":
+        Follow.follow(request.user.pk, author.pk)
+        following = True
+    else:
+        Follow.unfollow(request.user.pk, author.pk)
+        following = False
+    followers = UserStats.objects.filter(user=author).values_list(
+        "followers_count", flat=True
+    )
+    return JsonResponse({
+        "following": following,
+        "followers": followers.first() or 0,
+    })
+
+
+@login_required()
+def export(request, username):
+    """Функция для выгрузки постов и комментариев автора файлом."""
+    author = get_object_or_404(User, username=username)
+    if request.user != author and not request.user.is_staff:
+        raise PermissionDenied
+    export_format = request.GET.get("format", "jsonl")
+    if export_format not in EXPORT_FORMATS:
+        raise Http404
+    compress = bool(request.GET.get("gzip"))
+    filename = f"{author.username}.{export_format}"
+    content_type = EXPORT_FORMATS[export_format]
+    if compress:
+        filename += ".gz"
+        content_type = "application/gzip"
+    response = StreamingHttpResponse(
+        export_posts(author, export_format, compress),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
 def year(request):
     """Функция для отображения года на страницах."""
     years = datetime.now().year
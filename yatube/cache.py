@@ -0,0 +1,242 @@
+"""Общий для всех процессов кэш на SQLite.
+
+LocMemCache хранит данные в памяти каждого воркера gunicorn: сброс кэша
+не доходит до соседних процессов, а расход памяти растёт с числом
+воркеров. SQLiteCache хранит записи в одном файле на хосте, вытесняет
+давно не читанные записи (LRU) при превышении MAX_ENTRIES и атомарно
+увеличивает счётчики между процессами.
+
+Число записей проверяется не на каждой записи в кэш, а на каждой
+CULL_EVERY-й в процессе: COUNT(*) обходит всю таблицу. Между проверками
+кэш может ненадолго превысить MAX_ENTRIES.
+
+Пример настройки::
+
+    CACHES = {
+        "default": {
+            "BACKEND": "yatube.cache.SQLiteCache",
+            "LOCATION": "/var/tmp/yatube-cache.sqlite3",
+            "OPTIONS": {"MAX_ENTRIES": 10000, "CULL_EVERY": 100},
+        }
+    }
+"""
+import itertools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS cache ("
+    " key TEXT PRIMARY KEY,"
+    " value BLOB NOT NULL,"
+    " expires REAL,"
+    " accessed REAL NOT NULL"
+    ")",
+    "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)",
+    "CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)",
+)
+# Время последнего чтения обновляется не чаще раза в секунду, чтобы
+# частые чтения одного ключа не превращались в запись на каждый запрос.
+TOUCH_INTERVAL = 1.0
+
+
+class SQLiteCache(BaseCache):
+    """Бэкенд кэша Django, хранящий записи в файле SQLite."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get("OPTIONS", {})
+        self._busy_timeout = float(options.get("BUSY_TIMEOUT", 5))
+        self._cull_every = max(int(options.get("CULL_EVERY", 100)), 1)
+        self._writes = itertools.count(1)
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        # Соединение SQLite нельзя переносить между потоками и через
+        # fork, поэтому оно создаётся отдельно для потока и процесса.
+        pid = os.getpid()
+        if getattr(self._local, "pid", None) != pid:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = pid
+        return self._local.connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    @staticmethod
+    def _dump(value):
+        # Целые числа хранятся как INTEGER, чтобы incr выполнялся в SQL.
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _load(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(
+                "DELETE FROM cache WHERE key = ? AND expires <= ?", (key, now)
+            )
+            added = connection.execute(
+                "INSERT OR IGNORE INTO cache VALUES (?, ?, ?, ?)",
+                (key, self._dump(value),
+                 self.get_backend_timeout(timeout), now),
+            ).rowcount == 1
+            if added:
+                self._cull(connection, now)
+        return added
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        key_map = {self._key(key, version): key for key in keys}
+        now = time.time()
+        connection = self._connection
+        placeholders = ",".join("?" * len(key_map))
+        rows = connection.execute(
+            f"SELECT key, value, accessed FROM cache "
+            f"WHERE key IN ({placeholders}) "
+            f"AND (expires IS NULL OR expires > ?)",
+            (*key_map, now),
+        ).fetchall()
+        stale = [key for key, _, accessed in rows
+                 if now - accessed > TOUCH_INTERVAL]
+        if stale:
+            connection.executemany(
+                "UPDATE cache SET accessed = ? WHERE key = ?",
+                [(now, key) for key in stale],
+            )
+        return {key_map[key]: self._load(value) for key, value, _ in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self._key(key, version), self._dump(value), expires, now)
+            for key, value in data.items()
+        ]
+        with self._transaction() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", rows
+            )
+            self._cull(connection, now)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        return self._connection.execute(
+            "UPDATE cache SET expires = ?, accessed = ? "
+            "WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (self.get_backend_timeout(timeout), now, key, now),
+        ).rowcount == 1
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        self._connection.executemany(
+            "DELETE FROM cache WHERE key = ?",
+            [(self._key(key, version),) for key in keys],
+        )
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._connection.execute(
+            "SELECT 1 FROM cache "
+            "WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._transaction() as connection:
+            updated = connection.execute(
+                "UPDATE cache SET value = value + ?, accessed = ? "
+                "WHERE key = ? AND typeof(value) = 'integer' "
+                "AND (expires IS NULL OR expires > ?)",
+                (delta, now, key, now),
+            ).rowcount
+            if not updated:
+                raise ValueError(f"Key '{key}' not found")
+            value, = connection.execute(
+                "SELECT value FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        return value
+
+    def clear(self):
+        self._connection.execute("DELETE FROM cache")
+
+    def close(self, **kwargs):
+        # Соединение переиспользуется между запросами.
+        pass
+
+    def _cull(self, connection, now):
+        """Удаляет просроченные записи, а при переполнении — самые старые.
+
+        Проверка выполняется на каждой CULL_EVERY-й записи.
+        """
+        if next(self._writes) % self._cull_every:
+            return
+        count, = connection.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count <= self._max_entries:
+            return
+        connection.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+        count, = connection.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            connection.execute("DELETE FROM cache")
+            return
+        connection.execute(
+            "DELETE FROM cache WHERE key IN ("
+            " SELECT key FROM cache ORDER BY accessed LIMIT ?"
+            ")",
+            (max(count // self._cull_frequency, count - self._max_entries),),
+        )
@@ -0,0 +1,26 @@
+"""Настройка новых соединений с базой.
+
+Прагмы SQLite задаются в настройках базы ключом PRAGMAS и выполняются
+при каждом новом соединении::
+
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": "db.sqlite3",
+            "CONN_MAX_AGE": 60,
+            "PRAGMAS": {"journal_mode": "WAL", "synchronous": "NORMAL"},
+        }
+    }
+
+Порядок прагм сохраняется: journal_mode имеет смысл ставить первой.
+"""
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Обработчик connection_created: выполняет прагмы соединения."""
+    if connection.vendor != "sqlite":
+        return
+    # Прагмы выполняются напрямую, мимо обёрток execute: это настройка
+    # соединения, а не запросы страницы, и в учёт запросов они не идут.
+    for name, value in connection.settings_dict.get("PRAGMAS", {}).items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
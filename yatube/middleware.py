@@ -0,0 +1,83 @@
+"""Учёт SQL-запросов каждого запроса к сайту.
+
+QueryBudgetMiddleware считает запросы ко всем базам, их суммарное время
+и самый медленный запрос и пишет итог в журнал с именем URL, а при
+QUERY_TIMING_HEADER добавляет заголовок Server-Timing. Если число
+запросов превышает бюджет из QUERY_BUDGETS, превышение пишется
+в журнал, а при QUERY_BUDGET_STRICT (включён в тестах) вызывает
+QueryBudgetExceeded.
+"""
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Страница выполнила больше SQL-запросов, чем разрешено бюджетом."""
+
+
+class QueryStats:
+    """Обёртка execute, собирающая статистику запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = (0.0, None)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.duration += duration
+            if duration >= self.slowest[0]:
+                self.slowest = (duration, sql)
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL-запросы страницы и сверяет их с бюджетом."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        name = match.url_name if match else None
+        slowest_duration, slowest_sql = stats.slowest
+        logger.debug(
+            "%s: %d запросов, %.1f мс, самый долгий %.1f мс: %s",
+            name or request.path,
+            stats.count,
+            stats.duration * 1000,
+            slowest_duration * 1000,
+            slowest_sql,
+        )
+        if getattr(settings, "QUERY_TIMING_HEADER", False):
+            response["Server-Timing"] = (
+                f'db;dur={stats.duration * 1000:.1f};'
+                f'desc="{stats.count} SQL"'
+            )
+
+        budget = getattr(settings, "QUERY_BUDGETS", {}).get(name)
+        if budget is not None and stats.count > budget:
+            message = (
+                f"Страница {name} выполнила {stats.count} SQL-запросов "
+                f"при бюджете {budget}, самый долгий: {slowest_sql}"
+            )
+            if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,98 @@
+"""Разделение чтения и записи между основной базой и репликами.
+
+Чтения внутри запроса к сайту уходят в реплику из REPLICA_DATABASES,
+выбранную случайно один раз на запрос, записи — в default. Все
+чтения запроса видят одно состояние данных, даже если реплики отстают
+по-разному. Запрос, который уже писал в базу,
+а также любой запрос не методом GET/HEAD/OPTIONS читает из default.
+ReplicaRoutingMiddleware после записи ставит cookie, и следующие
+REPLICA_STICKY_SECONDS секунд этот пользователь тоже читает из default,
+поэтому видит свои изменения, даже если реплика отстаёт.
+
+Вне запросов (команды, shell, фоновые потоки) всё читается из default.
+Сессии, пользователи, права и типы содержимого тоже всегда читаются из
+default: только что созданная сессия может ещё не дойти до реплики.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY_DATABASE = "default"
+STICKY_COOKIE = "read_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+PRIMARY_APPS = ("auth", "contenttypes", "sessions")
+
+_routing = ContextVar("replica_routing", default=None)
+
+
+class Routing:
+    """Состояние маршрутизации текущего запроса к сайту."""
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.written = False
+        self.replica = None
+
+    def choose_replica(self, replicas):
+        """Реплика запроса: выбирается при первом чтении."""
+        if self.replica not in replicas:
+            self.replica = random.choice(replicas)
+        return self.replica
+
+
+class ReplicaRouter:
+    """Маршрутизатор: чтение из реплик, запись в основную базу."""
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        replicas = getattr(settings, "REPLICA_DATABASES", ())
+        if (
+            routing is None or routing.pinned or not replicas
+            or model._meta.app_label in PRIMARY_APPS
+        ):
+            return PRIMARY_DATABASE
+        return routing.choose_replica(replicas)
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            # Дальнейшие чтения запроса должны видеть эту запись.
+            routing.pinned = True
+            routing.written = True
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики — копии основной базы, их схема приходит вместе с данными.
+        return db not in getattr(settings, "REPLICA_DATABASES", ())
+
+
+class ReplicaRoutingMiddleware:
+    """Включает чтение из реплик на время запроса и закрепляет
+    пользователя за основной базой после его записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routing = Routing(
+            pinned=request.method not in SAFE_METHODS
+            or STICKY_COOKIE in request.COOKIES
+        )
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if routing.written:
+            response.set_cookie(
+                STICKY_COOKIE,
+                "1",
+                max_age=getattr(settings, "REPLICA_STICKY_SECONDS", 10),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,10 @@
+"""Настройки проекта.
+
+Профиль выбирается через DJANGO_SETTINGS_MODULE:
+
+* yatube.settings.dev — разработка (DEBUG, django-debug-toolbar);
+* yatube.settings.prod — боевой сервер, настройки из окружения.
+
+yatube.settings совпадает с профилем dev.
+"""
+from yatube.settings.dev import *  # noqa
@@ -0,0 +1,221 @@
+"""
+Django settings for yatube project.
+
+Generated by 'django-admin startproject' using Django 2.2.
+
+Общие настройки профилей dev и prod: профили импортируют этот модуль
+и дополняют его, не изменяя списки и словари на месте.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/2.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/2.2/ref/settings/
+"""
+
+import os
+
+# Build paths inside the project like this: os.path.join(BASE_DIR, ...)
+BASE_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+ALLOWED_HOSTS = [
+    "localhost",
+    "127.0.0.1",
+    "[::1]",
+    "testserver",
+]
+
+# Application definition
+
+INSTALLED_APPS = [
+    "users",
+    "posts",
+
+    "django.contrib.admin",
+    "django.contrib.auth",
+    "django.contrib.contenttypes",
+    "django.contrib.sessions",
+    "django.contrib.messages",
+    "django.contrib.staticfiles",
+    "django.contrib.sites",
+    "django.contrib.flatpages",
+    "sorl.thumbnail",
+]
+
+MIDDLEWARE = [
+    "yatube.middleware.QueryBudgetMiddleware",
+    "yatube.routers.ReplicaRoutingMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "django.middleware.csrf.CsrfViewMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "django.contrib.messages.middleware.MessageMiddleware",
+    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+]
+
+# Общий для всех воркеров кэш: сброс поколения страниц и счётчики
+# видны каждому процессу на хосте.
+CACHES = {
+    "default": {
+        "BACKEND": "yatube.cache.SQLiteCache",
+        "LOCATION": os.environ.get(
+            "CACHE_LOCATION", os.path.join(BASE_DIR, "cache.sqlite3")
+        ),
+        "OPTIONS": {"MAX_ENTRIES": 10000, "CULL_EVERY": 100},
+    }
+}
+
+# Миниатюры создаются в фоне, шаблоны только ищут готовые.
+THUMBNAIL_BACKEND = "posts.thumbnails.ThumbnailBackend"
+THUMBNAIL_KVSTORE = "posts.thumbnails.KVStore"
+
+# Наибольшее число SQL-запросов страницы по имени URL, включая сессию,
+# пользователя, поиск миниатюр для карточек и чтение поколения кэша
+# страниц. Превышение пишется в журнал, а при QUERY_BUDGET_STRICT
+# вызывает исключение: его включают TEST_RUNNER и conftest.py для pytest.
+QUERY_BUDGETS = {
+    "index": 6,
+    "group_post": 8,
+    "profile": 8,
+    "post_view": 5,
+    "follow_index": 6,
+    "post_comments": 4,
+    "search": 6,
+    "trending": 6,
+}
+QUERY_BUDGET_STRICT = False
+# Заголовок Server-Timing с числом и временем SQL-запросов страницы
+# раскрывает устройство сайта и включается только при разработке.
+QUERY_TIMING_HEADER = False
+
+TEST_RUNNER = "yatube.test_runner.TestRunner"
+
+ROOT_URLCONF = "yatube.urls"
+
+TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+
+TEMPLATES = [
+    {
+        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "DIRS": [TEMPLATES_DIR],
+        "APP_DIRS": True,
+        "OPTIONS": {
+            "context_processors": [
+                "django.template.context_processors.debug",
+                "django.template.context_processors.request",
+                "django.contrib.auth.context_processors.auth",
+                "django.contrib.messages.context_processors.messages",
+
+                "posts.views.year",
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = "yatube.wsgi.application"
+
+
+# Database
+# https://docs.djangoproject.com/en/2.2/ref/settings/#databases
+
+# Прагмы выполняются для каждого нового соединения (yatube/db.py).
+# WAL позволяет читать во время записи, busy_timeout заставляет писателей
+# ждать блокировку вместо ошибки «database is locked».
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    # Отрицательное значение задаёт размер кэша страниц в КиБ.
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", -64 * 1024)),
+}
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ.get(
+            "DATABASE_PATH", os.path.join(BASE_DIR, "db.sqlite3")
+        ),
+        # Соединение переживает запрос и не открывается заново каждый раз.
+        "CONN_MAX_AGE": int(os.environ.get("DATABASE_CONN_MAX_AGE", 60)),
+        "PRAGMAS": SQLITE_PRAGMAS,
+    }
+}
+
+# Реплики только для чтения: пути к копиям базы через запятую, например
+# DATABASE_REPLICAS=db.replica.sqlite3. Копии обновляет sync_replica.
+REPLICA_DATABASES = []
+for number, name in enumerate(
+        filter(None, os.environ.get("DATABASE_REPLICAS", "").split(",")), 1
+):
+    DATABASES[f"replica{number}"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": name,
+        "CONN_MAX_AGE": DATABASES["default"]["CONN_MAX_AGE"],
+        "PRAGMAS": {**SQLITE_PRAGMAS, "query_only": "ON"},
+        "TEST": {"MIRROR": "default"},
+    }
+    REPLICA_DATABASES.append(f"replica{number}")
+
+DATABASE_ROUTERS = ["yatube.routers.ReplicaRouter"]
+# Сколько секунд после записи пользователь читает из основной базы.
+REPLICA_STICKY_SECONDS = 10
+
+# Лимиты записей: (размер корзины токенов, секунд на её наполнение).
+THROTTLE_RATES = {
+    "post": (10, 600),
+    "comment": (20, 60),
+    "follow": (60, 60),
+}
+# Брать адрес клиента из X-Forwarded-For (только за своим прокси).
+THROTTLE_TRUST_FORWARDED = (
+    os.environ.get("THROTTLE_TRUST_FORWARDED", "0") == "1"
+)
+
+
+# Password validation
+# https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",},
+    {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator",},
+    {"NAME": "django.contrib.auth.password_validation.CommonPasswordValidator",},
+    {"NAME": "django.contrib.auth.password_validation.NumericPasswordValidator",},
+]
+
+# Internationalization
+# https://docs.djangoproject.com/en/2.2/topics/i18n/
+
+LANGUAGE_CODE = "ru"
+TIME_ZONE = "UTC"
+USE_I18N = True
+USE_L10N = True
+USE_TZ = True
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/2.2/howto/static-files/
+
+STATIC_URL = "/static/"
+STATIC_ROOT = os.path.join(BASE_DIR, "static")
+
+MEDIA_URL = "/media/"
+MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+
+# Идентификатор текущего сайта
+SITE_ID = 1
+# Login
+LOGIN_URL = "/auth/login/"
+LOGIN_REDIRECT_URL = "index"
+# LOGOUT_REDIRECT_URL = "index"
+
+#  Подключаем движок filebased.EmailBackend.
+EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
+# Указываем директорию, в которую будут складываться файлы писем.
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
@@ -0,0 +1,16 @@
+"""Профиль разработки: DEBUG и панель django-debug-toolbar."""
+from yatube.settings.base import *  # noqa
+from yatube.settings.base import INSTALLED_APPS, MIDDLEWARE
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = "hkqzz0-+y1j_*op0x%srj1_(=n&lto4&h%xz=1fgab_wy5n9wm"
+
+DEBUG = True
+
+INSTALLED_APPS = INSTALLED_APPS + ["debug_toolbar"]
+
+MIDDLEWARE = MIDDLEWARE + ["debug_toolbar.middleware.DebugToolbarMiddleware"]
+
+INTERNAL_IPS = ["127.0.0.1"]
+
+QUERY_TIMING_HEADER = True
@@ -0,0 +1,51 @@
+"""Боевой профиль: без отладки, с кэшем шаблонов, настройки из окружения.
+
+Обязательна переменная DJANGO_SECRET_KEY. Остальные необязательны:
+DJANGO_ALLOWED_HOSTS (через запятую), DATABASE_PATH, DATABASE_CONN_MAX_AGE,
+DATABASE_REPLICAS, SQLITE_* и CACHE_LOCATION из base, а также
+DJANGO_LOG_LEVEL.
+"""
+import os
+
+from yatube.settings.base import *  # noqa
+from yatube.settings.base import TEMPLATES
+
+SECRET_KEY = os.environ["DJANGO_SECRET_KEY"]
+
+DEBUG = False
+
+ALLOWED_HOSTS = list(filter(None, os.environ.get(
+    "DJANGO_ALLOWED_HOSTS", "localhost"
+).split(",")))
+
+# Шаблоны компилируются один раз на процесс. APP_DIRS несовместим
+# с явным списком загрузчиков, поэтому шаблоны приложений подключает
+# app_directories.Loader.
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        "APP_DIRS": False,
+        "OPTIONS": {
+            **TEMPLATES[0]["OPTIONS"],
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                ),
+            ],
+        },
+    },
+]
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "root": {
+        "handlers": ["console"],
+        "level": os.environ.get("DJANGO_LOG_LEVEL", "WARNING"),
+    },
+}
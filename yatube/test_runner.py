@@ -0,0 +1,54 @@
+"""Настройки всего тестового запуска.
+
+В тестах превышение бюджета запросов страницы вызывает исключение, а не
+только пишется в журнал: тест, которому понадобилось больше запросов,
+падает сразу. Кэш тестов лежит во временном каталоге, поэтому
+cache.clear() в тестах не трогает файл кэша разработчика.
+
+TestRunner включает эти настройки для manage.py test, conftest.py — для
+pytest.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestSettings:
+    """Переопределение настроек на время тестового запуска."""
+
+    def enable(self):
+        self._directory = tempfile.TemporaryDirectory(prefix="yatube-test-")
+        caches = {
+            alias: {
+                **options,
+                "LOCATION": os.path.join(
+                    self._directory.name, f"{alias}.sqlite3"
+                ),
+            }
+            if options["BACKEND"] == "yatube.cache.SQLiteCache" else options
+            for alias, options in settings.CACHES.items()
+        }
+        self._override = override_settings(
+            QUERY_BUDGET_STRICT=True, CACHES=caches
+        )
+        self._override.enable()
+
+    def disable(self):
+        self._override.disable()
+        self._directory.cleanup()
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner с настройками тестового запуска."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_settings = TestSettings()
+        self._test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_settings.disable()
+        super().teardown_test_environment(**kwargs)
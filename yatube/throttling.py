@@ -0,0 +1,177 @@
+"""Ограничение частоты записей по алгоритму корзины токенов.
+
+Лимит области задаётся в THROTTLE_RATES парой (размер корзины, секунд на
+её полное наполнение): (10, 60) разрешает 10 записей подряд, а дальше по
+одной каждые 6 секунд. Корзины ведутся отдельно для адреса клиента и для
+пользователя; новая сессия или cookie лимит пользователя не сбрасывают.
+
+Проверка лимита не читает базу. Id пользователя берётся из подписанной
+cookie THROTTLE_COOKIE, привязанной к ключу сессии. Если cookie нет или
+она выдана для другой сессии, id один раз читается из сессии, а cookie
+ставится в ответ.
+
+Корзина хранится в кэше как одно целое число — момент в миллисекундах,
+когда она снова станет полной (вариант GCRA). Каждый запрос атомарно
+прибавляет к нему интервал одного токена через cache.incr; если корзина
+переполнилась, прибавка откатывается и запрос получает 429 с заголовком
+Retry-After. Токены, уже взятые этим запросом из других корзин, тогда
+возвращаются. Ключ живёт до наполнения корзины, поэтому отсутствие ключа
+означает полную корзину.
+"""
+import hashlib
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.http import HttpResponse
+
+THROTTLE_KEY = "throttle.{}.{}.{}"
+THROTTLE_COOKIE = "throttle_user"
+THROTTLE_COOKIE_SALT = "yatube.throttling"
+
+
+def client_ip(request):
+    """Адрес клиента; за обратным прокси — первый из X-Forwarded-For."""
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+    if forwarded and getattr(settings, "THROTTLE_TRUST_FORWARDED", False):
+        return forwarded.split(",")[0].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def identities(request):
+    """Пары (вид, отпечаток), для которых ведутся корзины запроса."""
+    yield "ip", fingerprint(client_ip(request))
+    user_id = throttle_user(request)
+    if user_id is not None:
+        yield "user", fingerprint(str(user_id))
+
+
+def throttle_user(request):
+    """Id вошедшего пользователя запроса или None.
+
+    Сессия читается, только если в запросе нет действующей cookie
+    THROTTLE_COOKIE; значение для неё остаётся в request.throttle_cookie.
+    """
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return None
+    value = request.get_signed_cookie(
+        THROTTLE_COOKIE, default=None, salt=THROTTLE_COOKIE_SALT
+    )
+    if value:
+        key, _, user_id = value.rpartition(":")
+        if key == session_key:
+            return user_id
+    user_id = request.session.get(SESSION_KEY)
+    if user_id is not None:
+        request.throttle_cookie = f"{session_key}:{user_id}"
+    return user_id
+
+
+def fingerprint(value):
+    """Короткий хэш значения для ключа корзины."""
+    return hashlib.sha1(value.encode()).hexdigest()[:16]
+
+
+def take_token(key, burst, period, now=None):
+    """Берёт токен из корзины key.
+
+    Возвращает 0, если токен выдан, иначе — сколько секунд ждать.
+    """
+    now = int((time.time() if now is None else now) * 1000)
+    interval = period * 1000 // burst
+    horizon = interval * burst
+    # Ключ мог истечь между add и incr: тогда корзина снова полная.
+    for _ in range(2):
+        cache.add(key, now, math.ceil(horizon / 1000))
+        try:
+            full_at = cache.incr(key, interval)
+            break
+        except ValueError:
+            continue
+    else:
+        return 0
+    if full_at - now > horizon:
+        cache.decr(key, interval)
+        return max(1, math.ceil((full_at - horizon - now) / 1000))
+    cache.touch(key, math.ceil((full_at - now) / 1000))
+    return 0
+
+
+def return_token(key, burst, period):
+    """Возвращает в корзину key токен, выданный take_token."""
+    try:
+        cache.decr(key, period * 1000 // burst)
+    except ValueError:
+        # Корзина уже наполнилась и ключ истёк.
+        pass
+
+
+def take_tokens(keys, burst, period):
+    """Берёт по токену из каждой корзины keys: из всех или ни из одной.
+
+    Возвращает 0 или время ожидания первой отказавшей корзины; токены,
+    взятые до отказа, возвращаются.
+    """
+    taken = []
+    for key in keys:
+        wait = take_token(key, burst, period)
+        if wait:
+            for granted in taken:
+                return_token(granted, burst, period)
+            return wait
+        taken.append(key)
+    return 0
+
+
+def set_throttle_cookie(request, response):
+    """Ставит cookie с id пользователя, прочитанным из сессии."""
+    value = getattr(request, "throttle_cookie", None)
+    if value:
+        response.set_signed_cookie(
+            THROTTLE_COOKIE,
+            value,
+            salt=THROTTLE_COOKIE_SALT,
+            max_age=settings.SESSION_COOKIE_AGE,
+            httponly=True,
+            samesite="Lax",
+        )
+    return response
+
+
+def throttle(scope, methods=None):
+    """Ограничивает запросы к представлению лимитом THROTTLE_RATES[scope].
+
+    methods — методы запросов, которые тратят токены; по умолчанию все.
+    Лимит читается при каждом запросе, области без лимита не
+    ограничиваются.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            rate = getattr(settings, "THROTTLE_RATES", {}).get(scope)
+            if rate and (methods is None or request.method in methods):
+                burst, period = rate
+                wait = take_tokens(
+                    (
+                        THROTTLE_KEY.format(scope, kind, value)
+                        for kind, value in identities(request)
+                    ),
+                    burst,
+                    period,
+                )
+                if wait:
+                    response = HttpResponse(
+                        f"Слишком много запросов. Повторите через {wait} с.",
+                        status=429,
+                        content_type="text/plain; charset=utf-8",
+                    )
+                    response["Retry-After"] = str(wait)
+                    return set_throttle_cookie(request, response)
+            response = view(request, *args, **kwargs)
+            return set_throttle_cookie(request, response)
+        return wrapper
+    return decorator